@@ -1,18 +1,34 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, g
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime
+import atexit
+import csv
+import functools
+import io
+import json
+import logging
 import os
+import zipfile
 
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config.from_object(Config)
 
 # Initialize db instance from models package to avoid circular imports
-from models import db
+from models import db, configure_sqlite
 db.init_app(app)
+with app.app_context():
+    configure_sqlite(
+        db.engine,
+        journal_mode=app.config['SQLITE_JOURNAL_MODE'],
+        synchronous=app.config['SQLITE_SYNCHRONOUS'],
+        busy_timeout_ms=app.config['SQLITE_BUSY_TIMEOUT_MS']
+    )
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -20,8 +36,85 @@ login_manager.login_view = 'login'
 # Import models after db initialization (within app context when needed)
 from models.user import User
 from models.emotion_log import EmotionLog
+from models.emotion_rollup import EmotionDailyRollup, backfill_rollups, backfill_rollups_if_empty
+from models.migrations import upgrade_schema
 from utils.motivation import get_motivation_message
-from ml.predict import predict_emotion
+from utils.jobs import create_job_queue, DONE, FAILED
+from utils.analytics import emotion_summary, daily_counts, parse_date, GRANULARITIES
+from utils.live_updates import dashboard_events
+from utils.history import history_page, DEFAULT_PAGE_SIZE
+from utils.log_writer import EmotionLogWriter
+from ml.predict import (
+    predict_emotion, predict_faces, predict_batch, predict_audio_timeline, predict_audio_stream,
+    configure_batching, batching_stats, configure_cache, cache_stats, configure_text_cascade,
+    EMOTION_LABELS, BATCH_SIZE as PREDICT_BATCH_SIZE
+)
+from ml.registry import configure_backends
+from ml.fusion import predict_multimodal, configure_fusion
+from ml.face_stream import FaceStreamManager
+from ml.metrics import metrics, configure_metrics, span
+from ml.warmup import start_warmup, readiness
+
+configure_backends(app.config['INFERENCE_BACKENDS'])
+configure_metrics(app.config['METRICS_ENABLED'])
+if app.config['WARMUP_MODELS']:
+    start_warmup(app.config['WARMUP_MODELS'])
+configure_batching(
+    enabled=app.config['INFERENCE_BATCHING'],
+    max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE'],
+    max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS']
+)
+configure_text_cascade(app.config['TEXT_CASCADE_THRESHOLD'] if app.config['TEXT_CASCADE'] else None)
+configure_fusion(app.config['FUSION_WORKERS'])
+configure_cache(
+    backend=app.config['PREDICTION_CACHE'],
+    max_entries=app.config['PREDICTION_CACHE_SIZE'],
+    ttl=app.config['PREDICTION_CACHE_TTL'],
+    path=app.config['PREDICTION_CACHE_PATH']
+)
+
+# Bytes read from the request body per step of a streamed audio upload
+AUDIO_STREAM_CHUNK = 64 * 1024
+
+face_streams = FaceStreamManager(
+    detect_every=app.config['FACE_STREAM_DETECT_EVERY'],
+    session_ttl=app.config['FACE_STREAM_SESSION_TTL']
+)
+
+# Longest a client may long-poll /api/jobs/<id>, in seconds
+MAX_JOB_WAIT = 30
+
+log_writer = EmotionLogWriter(
+    app,
+    mode=app.config['LOG_WRITE_MODE'],
+    flush_rows=app.config['LOG_FLUSH_ROWS'],
+    flush_interval=app.config['LOG_FLUSH_INTERVAL'],
+    max_pending=app.config['LOG_MAX_PENDING']
+)
+atexit.register(log_writer.close)
+
+def log_job_result(job):
+    '''
+    Persist the EmotionLog of a finished async prediction
+    '''
+    log_writer.log(job['user_id'], job['result']['emotion'], job['result']['confidence'], job['model_type'])
+
+job_queue = None
+if app.config['ASYNC_DETECTION']:
+    job_queue = create_job_queue(
+        broker=app.config['ASYNC_JOB_BROKER'],
+        path=app.config['ASYNC_JOB_DB_PATH'],
+        workers=app.config['ASYNC_JOB_WORKERS'],
+        result_ttl=app.config['JOB_RESULT_TTL'],
+        on_complete=log_job_result,
+        backends=app.config['INFERENCE_BACKENDS'],
+        cache_settings={
+            'backend': app.config['PREDICTION_CACHE'],
+            'max_entries': app.config['PREDICTION_CACHE_SIZE'],
+            'ttl': app.config['PREDICTION_CACHE_TTL'],
+            'path': app.config['PREDICTION_CACHE_PATH']
+        }
+    )
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -30,6 +123,142 @@ def load_user(user_id):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def read_upload(file, modality=''):
+    '''
+    Prediction input for an uploaded file
+
+    Uploads are decoded straight from memory; they are only written to
+    UPLOAD_FOLDER when SAVE_UPLOADS is enabled.
+    '''
+    with span('read_upload', modality):
+        data = file.read()
+        if app.config['SAVE_UPLOADS']:
+            filename = secure_filename(file.filename)
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            with open(filepath, 'wb') as f:
+                f.write(data)
+    return data
+
+# Endpoints whose total time is recorded as the 'request' stage; /api/detect/batch
+# is left out because its response is still streaming when the request ends
+TIMED_ENDPOINTS = {'detect': None, 'detect_audio_stream': 'audio'}
+
+@app.before_request
+def start_request_span():
+    if not metrics.enabled or request.endpoint not in TIMED_ENDPOINTS or request.method != 'POST':
+        return
+    modality = TIMED_ENDPOINTS[request.endpoint] or request.form.get('detection_type', '')
+    g.request_span = span('request', modality)
+    g.request_span.__enter__()
+
+@app.teardown_request
+def end_request_span(exc):
+    request_span = g.pop('request_span', None)
+    if request_span is not None:
+        request_span.__exit__(None, None, None)
+
+def enqueue_detection(upload, detection_type):
+    '''
+    Hand a prediction to the job queue and answer with its job id
+    '''
+    job_id = job_queue.submit(upload, detection_type, current_user.id)
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('get_job', job_id=job_id)
+    }), 202
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+AUDIO_EXTENSIONS = {'wav', 'mp3'}
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def read_text_rows(data, extension):
+    '''
+    Texts from an uploaded CSV (a 'text' column, else the first column) or TXT (one per line)
+    '''
+    content = data.decode('utf-8-sig', errors='replace')
+    if extension == 'txt':
+        return [line.strip() for line in content.splitlines() if line.strip()]
+
+    rows = list(csv.reader(io.StringIO(content)))
+    if not rows:
+        return []
+    header = [column.strip().lower() for column in rows[0]]
+    if 'text' in header:
+        column = header.index('text')
+        rows = rows[1:]
+    else:
+        column = 0
+    return [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+
+def batch_texts(texts):
+    '''
+    (index, text) pairs of the non-blank texts, stripped like /detect's text input
+    '''
+    texts = [(str(i), str(text).strip()) for i, text in enumerate(texts)]
+    return [(name, text) for name, text in texts if text]
+
+def parse_batch_inputs():
+    '''
+    Group the inputs of a batch request by detection type
+
+    Accepts a JSON body {"texts": [...]}, a 'texts' form list, or an uploaded
+    'file': CSV/TXT of texts or a ZIP of images and audio clips.
+    Returns {detection_type: [(name, input), ...]}. ZIP members are not
+    decompressed here: their input is a callable reading the member, so
+    they are loaded one scoring chunk at a time. Raises ValueError when a
+    ZIP holds more than BATCH_MAX_ITEMS inputs or more than
+    BATCH_MAX_UNCOMPRESSED_BYTES of them.
+    '''
+    payload = request.get_json(silent=True)
+    if payload and isinstance(payload.get('texts'), list):
+        return {'text': batch_texts(payload['texts'])}
+
+    if request.form.getlist('texts'):
+        return {'text': batch_texts(request.form.getlist('texts'))}
+
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return {}
+
+    extension = file_extension(file.filename)
+    if extension in ('csv', 'txt'):
+        texts = read_text_rows(file.read(), extension)
+        return {'text': [(str(i), text) for i, text in enumerate(texts)]}
+
+    if extension != 'zip':
+        return {}
+
+    max_items = app.config['BATCH_MAX_ITEMS']
+    max_bytes = app.config['BATCH_MAX_UNCOMPRESSED_BYTES']
+    groups = {'face': [], 'audio': []}
+    count = total_size = 0
+    # The compressed upload (at most MAX_CONTENT_LENGTH) is kept in memory, as the
+    # request's temporary file may be closed before the streamed response reads it
+    archive = zipfile.ZipFile(io.BytesIO(file.read()))
+    for member in archive.infolist():
+        if member.is_dir() or member.file_size > app.config['MAX_CONTENT_LENGTH']:
+            continue
+        member_extension = file_extension(member.filename)
+        if member_extension in IMAGE_EXTENSIONS:
+            detection_type = 'face'
+        elif member_extension in AUDIO_EXTENSIONS:
+            detection_type = 'audio'
+        else:
+            continue
+
+        # zipfile never inflates a member past its declared file_size
+        count += 1
+        total_size += member.file_size
+        if count > max_items:
+            raise ValueError(f'At most {max_items} inputs per batch')
+        if total_size > max_bytes:
+            raise ValueError(f'Archive expands to more than {max_bytes // (1024 * 1024)} MB')
+        groups[detection_type].append((member.filename, functools.partial(archive.read, member)))
+    return {detection_type: items for detection_type, items in groups.items() if items}
+
 # Routes
 @app.route('/')
 def index():
@@ -105,43 +334,41 @@ def detect():
 
             file = request.files['face_file']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                upload = read_upload(file, 'face')
+                multi_face = request.form.get('multi_face') == '1'
 
-                emotion, confidence = predict_emotion(filepath, 'face')
+                if job_queue is not None and not multi_face and len(upload) >= app.config['ASYNC_IMAGE_MIN_BYTES']:
+                    return enqueue_detection(upload, 'face')
+
+                # Opt-in: score every face in the picture instead of the first
+                faces = None
+                if multi_face:
+                    result = predict_faces(upload)
+                    emotion, confidence, faces = result['emotion'], result['confidence'], result['faces']
+                else:
+                    emotion, confidence = predict_emotion(upload, 'face')
 
                 # Log emotion
-                log = EmotionLog(
-                    user_id=current_user.id,
-                    emotion=emotion,
-                    confidence=confidence,
-                    detection_type='face'
-                )
-                db.session.add(log)
-                db.session.commit()
+                log_writer.log(current_user.id, emotion, confidence, 'face')
 
                 motivation = get_motivation_message(emotion)
 
-                return jsonify({
+                response = {
                     'emotion': emotion,
                     'confidence': confidence,
                     'motivation': motivation
-                })
+                }
+                if faces is not None:
+                    response['faces'] = faces
+
+                return jsonify(response)
 
         elif detection_type == 'text':
             text_input = request.form.get('text_input')
             if text_input:
                 emotion, confidence = predict_emotion(text_input, 'text')
 
-                log = EmotionLog(
-                    user_id=current_user.id,
-                    emotion=emotion,
-                    confidence=confidence,
-                    detection_type='text'
-                )
-                db.session.add(log)
-                db.session.commit()
+                log_writer.log(current_user.id, emotion, confidence, 'text')
 
                 motivation = get_motivation_message(emotion)
 
@@ -157,42 +384,74 @@ def detect():
 
             file = request.files['audio_file']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
+                upload = read_upload(file, 'audio')
+                # Opt-in: score the whole recording in overlapping windows
+                with_timeline = request.form.get('timeline') == '1'
+
+                if job_queue is not None and not with_timeline:
+                    return enqueue_detection(upload, 'audio')
 
-                emotion, confidence = predict_emotion(filepath, 'audio')
+                timeline = None
+                if with_timeline:
+                    result = predict_audio_timeline(upload)
+                    emotion, confidence, timeline = result['emotion'], result['confidence'], result['timeline']
+                else:
+                    emotion, confidence = predict_emotion(upload, 'audio')
 
-                log = EmotionLog(
-                    user_id=current_user.id,
-                    emotion=emotion,
-                    confidence=confidence,
-                    detection_type='audio'
-                )
-                db.session.add(log)
-                db.session.commit()
+                log_writer.log(current_user.id, emotion, confidence, 'audio')
 
                 motivation = get_motivation_message(emotion)
 
-                return jsonify({
+                response = {
                     'emotion': emotion,
                     'confidence': confidence,
                     'motivation': motivation
-                })
+                }
+                if timeline is not None:
+                    response['timeline'] = timeline
+
+                return jsonify(response)
+
+        elif detection_type == 'multimodal':
+            # Any of the three inputs; the given ones are predicted concurrently and fused
+            inputs = {}
+            face_file = request.files.get('face_file')
+            if face_file and face_file.filename and allowed_file(face_file.filename):
+                inputs['face'] = read_upload(face_file, 'face')
+            text_input = request.form.get('text_input', '').strip()
+            if text_input:
+                inputs['text'] = text_input
+            audio_file = request.files.get('audio_file')
+            if audio_file and audio_file.filename and allowed_file(audio_file.filename):
+                inputs['audio'] = read_upload(audio_file, 'audio')
+
+            if not inputs:
+                return jsonify({'error': 'Provide a face image, text and/or an audio clip'}), 400
+
+            result = predict_multimodal(inputs, app.config['FUSION_WEIGHTS'])
+            log_writer.log(current_user.id, result['emotion'], result['confidence'], 'multimodal')
+
+            result['motivation'] = get_motivation_message(result['emotion'])
+            return jsonify(result)
 
     return render_template('detect.html')
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    logs = EmotionLog.query.filter_by(user_id=current_user.id).order_by(EmotionLog.timestamp.desc()).all()
-    return render_template('dashboard.html', logs=logs)
+    # Statistics and charts are loaded from /api/emotion-summary, then kept
+    # current by /api/dashboard/stream starting after the newest log
+    total_logs = db.session.query(db.func.sum(EmotionDailyRollup.count)) \
+        .filter(EmotionDailyRollup.user_id == current_user.id).scalar() or 0
+    latest_log_id = db.session.query(db.func.max(EmotionLog.id)) \
+        .filter(EmotionLog.user_id == current_user.id).scalar() or 0
+    return render_template('dashboard.html', total_logs=total_logs, latest_log_id=latest_log_id)
 
 @app.route('/history')
 @login_required
 def history():
-    logs = EmotionLog.query.filter_by(user_id=current_user.id).order_by(EmotionLog.timestamp.desc()).limit(100).all()
-    return render_template('history.html', logs=logs)
+    # Rows are loaded page by page from /api/history
+    return render_template('history.html', emotions=EMOTION_LABELS, page_size=DEFAULT_PAGE_SIZE)
 
 @app.route('/games')
 @login_required
@@ -212,7 +471,291 @@ def get_emotion_data():
 
     return jsonify(data)
 
+@app.route('/api/history')
+@login_required
+def get_history():
+    '''
+    Newest-first page of logs; optional cursor, limit, emotion and detection_type
+    '''
+    try:
+        page = history_page(
+            current_user.id,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            emotion=request.args.get('emotion'),
+            detection_type=request.args.get('detection_type')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(page)
+
+@app.route('/api/detect/batch', methods=['POST'])
+@login_required
+def detect_batch():
+    try:
+        groups = parse_batch_inputs()
+    except (zipfile.BadZipFile, csv.Error) as e:
+        return jsonify({'error': f'Could not read upload: {e}'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    total = sum(len(items) for items in groups.values())
+    if total == 0:
+        return jsonify({'error': 'No inputs provided'}), 400
+    if total > app.config['BATCH_MAX_ITEMS']:
+        return jsonify({'error': f"At most {app.config['BATCH_MAX_ITEMS']} inputs per batch"}), 400
+
+    user_id = current_user.id
+
+    def generate():
+        # Results stream out per scored chunk; logs are inserted in one transaction at the end
+        logs = []
+        index = 0
+        for detection_type, items in groups.items():
+            # ZIP members are read just before their chunk is scored
+            for start in range(0, len(items), PREDICT_BATCH_SIZE):
+                chunk = items[start:start + PREDICT_BATCH_SIZE]
+                inputs = [item() if callable(item) else item for _, item in chunk]
+                for (name, _), (emotion, confidence, error) in zip(chunk, predict_batch(inputs, detection_type)):
+                    line = {
+                        'index': index,
+                        'input': name,
+                        'detection_type': detection_type,
+                        'emotion': emotion,
+                        'confidence': confidence
+                    }
+                    if error:
+                        line['error'] = error
+                    else:
+                        logs.append((user_id, emotion, confidence, detection_type))
+                    index += 1
+                    yield json.dumps(line) + '\n'
+
+        log_writer.log_many(logs)
+        yield json.dumps({'done': True, 'count': index, 'logged': len(logs)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/detect/audio-stream', methods=['POST'])
+@login_required
+def detect_audio_stream():
+    '''
+    Emotion timeline over a raw PCM body (e.g. a chunked upload from a recorder)
+
+    Query parameters: sample_rate (required), format ('f32le' or 's16le')
+    and channels. Windows are analyzed while the body is still arriving.
+    '''
+    sample_rate = request.args.get('sample_rate', type=int)
+    pcm_format = request.args.get('format', 'f32le')
+    channels = request.args.get('channels', 1, type=int)
+    if not sample_rate or pcm_format not in ('f32le', 's16le') or not channels or channels < 1:
+        return jsonify({'error': 'sample_rate, format (f32le/s16le) and channels are required'}), 400
+
+    chunks = iter(lambda: request.stream.read(AUDIO_STREAM_CHUNK), b'')
+    result = predict_audio_stream(chunks, sample_rate, pcm_format, channels)
+    if not result['timeline']:
+        return jsonify({'error': 'No audio could be analyzed'}), 400
+
+    log_writer.log(current_user.id, result['emotion'], result['confidence'], 'audio')
+
+    result['motivation'] = get_motivation_message(result['emotion'])
+    return jsonify(result)
+
+@app.route('/api/face-stream', methods=['POST'])
+@login_required
+def open_face_stream():
+    '''
+    Start a live webcam stream; frames are then posted to its frames_url
+    '''
+    stream = face_streams.open(current_user.id)
+    return jsonify({
+        'stream_id': stream.id,
+        'frames_url': url_for('post_face_frame', stream_id=stream.id)
+    }), 201
+
+@app.route('/api/face-stream/<stream_id>/frames', methods=['POST'])
+@login_required
+def post_face_frame(stream_id):
+    '''
+    One encoded frame (JPEG/PNG request body) with ?seq=<frame number>
+
+    Answers with the running emotion estimate. A frame superseded by a newer
+    one before it was analyzed comes back with status 'dropped'.
+    '''
+    stream = face_streams.get(stream_id, current_user.id)
+    if stream is None:
+        return jsonify({'error': 'Stream not found'}), 404
+
+    frame = request.get_data()
+    if not frame:
+        return jsonify({'error': 'No frame received'}), 400
+
+    try:
+        return jsonify(stream.submit(frame, request.args.get('seq', stream.last_seq + 1, type=int)))
+    except Exception:
+        logger.exception('Error in face stream')
+        return jsonify({'error': 'Frame could not be analyzed'}), 400
+
+@app.route('/api/face-stream/<stream_id>', methods=['DELETE'])
+@login_required
+def close_face_stream(stream_id):
+    '''
+    End a stream and log its final running estimate
+    '''
+    stream = face_streams.close(stream_id, current_user.id)
+    if stream is None:
+        return jsonify({'error': 'Stream not found'}), 404
+
+    emotion, confidence = stream.estimate()
+    response = {'emotion': emotion, 'confidence': confidence, 'frames': stream.frames, 'dropped': stream.dropped}
+    if emotion is not None:
+        log_writer.log(current_user.id, emotion, confidence, 'face')
+        response['motivation'] = get_motivation_message(emotion)
+    return jsonify(response)
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def get_job(job_id):
+    if job_queue is None:
+        return jsonify({'error': 'Async detection is disabled'}), 404
+
+    # ?wait=N long-polls for up to N seconds until the job finishes
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    job = job_queue.wait(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if job is None or job['user_id'] != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'detection_type': job['model_type']
+    }
+    if job['status'] == DONE:
+        response['emotion'] = job['result']['emotion']
+        response['confidence'] = job['result']['confidence']
+        response['motivation'] = get_motivation_message(job['result']['emotion'])
+    elif job['status'] == FAILED:
+        response['error'] = job['error']
+
+    return jsonify(response)
+
+@app.route('/api/emotion-summary')
+@login_required
+def get_emotion_summary():
+    '''
+    Aggregated dashboard data; optional start/end (YYYY-MM-DD) and granularity (day/week/month)
+    '''
+    try:
+        start = parse_date(request.args.get('start'))
+        end = parse_date(request.args.get('end'), end_of_day=True)
+        summary = emotion_summary(
+            current_user.id, start=start, end=end,
+            granularity=request.args.get('granularity', 'day')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(summary)
+
+@app.route('/api/heatmap')
+@login_required
+def get_heatmap():
+    '''
+    Detections per day for the calendar heatmap; optional days (default 365)
+    '''
+    days = request.args.get('days', 365, type=int)
+    if not 1 <= days <= 3660:
+        return jsonify({'error': 'days must be between 1 and 3660'}), 400
+
+    return jsonify(daily_counts(current_user.id, days=days))
+
+@app.route('/api/dashboard/stream')
+@login_required
+def dashboard_stream():
+    '''
+    Server-Sent Events with the user's new logs and updated totals
+
+    Resumes after the log id in the Last-Event-ID header (sent by
+    EventSource on reconnect) or the `since` parameter, so nothing
+    already delivered is replayed.
+    '''
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    granularity = request.args.get('granularity', 'day')
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID / since must be a log id'}), 400
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of {GRANULARITIES}'}), 400
+
+    user_id = current_user.id
+    if cursor is None:
+        # Fresh connection without a cursor: only logs from now on
+        cursor = db.session.query(db.func.max(EmotionLog.id)) \
+            .filter(EmotionLog.user_id == user_id).scalar() or 0
+
+    events = dashboard_events(
+        user_id, cursor, granularity,
+        poll_interval=app.config['LIVE_POLL_INTERVAL'],
+        max_seconds=app.config['LIVE_STREAM_MAX_SECONDS'],
+        max_streams=app.config['LIVE_STREAMS_PER_USER']
+    )
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    '''
+    Readiness: 200 once the WARMUP_MODELS are loaded and have run a prediction
+    '''
+    ready, models = readiness()
+    return jsonify({'ready': ready, 'models': models}), 200 if ready else 503
+
+@app.route('/metrics')
+def prometheus_metrics():
+    '''
+    Stage timings and prediction counters of this process, for Prometheus
+    '''
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/inference-stats')
+@login_required
+def get_inference_stats():
+    return jsonify({
+        'batching': batching_stats(),
+        'cache': cache_stats(),
+        'face_streams': face_streams.stats(),
+        'log_writer': log_writer.stats()
+    })
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    '''Create missing tables and indexes on an existing database.'''
+    created = upgrade_schema(backfill=False)
+    rows = backfill_rollups_if_empty()
+    print(f"Created indexes: {', '.join(created)}" if created else 'Schema is up to date')
+    if rows:
+        print(f'Backfilled {rows} rollup rows from existing emotion logs')
+
+@app.cli.command('backfill-rollups')
+def backfill_rollups_command():
+    '''Rebuild the daily emotion rollups from existing EmotionLog rows.'''
+    db.create_all()
+    rows = backfill_rollups()
+    print(f'Rebuilt {rows} rollup rows')
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade_schema()
     app.run(debug=True, host='0.0.0.0', port=5000)
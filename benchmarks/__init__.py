@@ -0,0 +1,2 @@
+# Load and latency benchmarks that run on synthetic stand-in models and data.
+# Usage: python -m benchmarks --json results.json
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Keep the repository importable after the benchmarks chdir into their workspace
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fixtures import build_workspace
+from benchmarks.load import MODES, run_load
+from benchmarks.micro import bench_loaders, bench_preprocessing
+
+MODALITIES = ('face', 'text', 'audio')
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(results):
+    if 'micro' in results:
+        print(f"\n{'microbenchmark':<24}{'min ms':>10}{'median ms':>12}")
+        for name, m in results['micro'].items():
+            print(f"{name:<24}{m['ms_min']:>10.2f}{m['ms_median']:>12.2f}")
+
+    if results['load']:
+        print(f"\n{'modality':<10}{'mode':<11}{'req':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}"
+              f"{'p99 ms':>9}{'per s':>8}{'RSS MB':>8}")
+        for r in results['load']:
+            rss = f"{r['peak_rss_mb']:.0f}" if r.get('peak_rss_mb') is not None else '-'
+            print(f"{r['modality']:<10}{r['mode']:<11}{r['requests']:>6}{r['errors']:>5}"
+                  f"{r['latency_ms_p50']:>9.1f}{r['latency_ms_p95']:>9.1f}{r['latency_ms_p99']:>9.1f}"
+                  f"{r['throughput_per_s']:>8.1f}{rss:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /detect and the data loaders on synthetic data')
+    parser.add_argument('modalities', nargs='*', default=list(MODALITIES), help='face, text and/or audio')
+    parser.add_argument('--requests', type=int, default=200, help='requests per modality')
+    parser.add_argument('--concurrency', type=int, default=4, help='threads or processes')
+    parser.add_argument('--mode', choices=MODES, default='threads')
+    parser.add_argument('--workspace', help='reuse or keep the generated models and data here')
+    parser.add_argument('--skip-micro', action='store_true', help='only run the load benchmarks')
+    parser.add_argument('--skip-load', action='store_true', help='only run the microbenchmarks')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    # Resolved now: the benchmarks change the working directory
+    json_path = os.path.abspath(args.json) if args.json else None
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix='pysra-bench-'))
+    if not os.path.exists(os.path.join(workspace, 'inputs')):
+        print(f"Building synthetic models and datasets in {workspace}")
+        build_workspace(workspace)
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'mode': args.mode,
+        },
+        'load': [],
+    }
+
+    if not args.skip_micro:
+        results['micro'] = dict(bench_loaders(workspace), **bench_preprocessing(workspace))
+
+    if not args.skip_load:
+        for modality in args.modalities:
+            results['load'].append(run_load(workspace, modality, args.requests, args.concurrency, args.mode))
+
+    print_report(results)
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nResults saved to {json_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import json
+
+LOAD_METRICS = ('latency_ms_p50', 'latency_ms_p95', 'latency_ms_p99', 'throughput_per_s', 'peak_rss_mb')
+
+def _change(before, after):
+    if before in (None, 0) or after is None:
+        return '-'
+    return f'{(after - before) / before:+.1%}'
+
+def compare(before, after):
+    '''
+    Print the relative change of every metric between two result files
+    '''
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+
+    micro_before, micro_after = before.get('micro', {}), after.get('micro', {})
+    for name in sorted(set(micro_before) & set(micro_after)):
+        b, a = micro_before[name]['ms_median'], micro_after[name]['ms_median']
+        print(f"{name:<32}{b:>10.2f}{a:>10.2f}{_change(b, a):>10}")
+
+    load_before = {(r['modality'], r['mode']): r for r in before.get('load', [])}
+    for r in after.get('load', []):
+        previous = load_before.get((r['modality'], r['mode']))
+        if previous is None:
+            continue
+        for metric in LOAD_METRICS:
+            b, a = previous.get(metric), r.get(metric)
+            if b is None or a is None:
+                continue
+            print(f"{r['modality'] + ' ' + metric:<32}{b:>10.2f}{a:>10.2f}{_change(b, a):>10}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+
+    with open(args.before) as f, open(args.after) as g:
+        compare(json.load(f), json.load(g))
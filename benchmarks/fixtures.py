@@ -0,0 +1,151 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from ml.predict import EMOTION_LABELS, TEXT_EMOTION_MAPPING, AUDIO_EMOTION_MAPPING
+from ml.registry import MODEL_DIR, MODEL_FILES
+from ml.media import AUDIO_SAMPLE_RATE
+
+# Sizes of the synthetic datasets
+FER_ROWS = 2000
+TEXT_ROWS = 2000
+AUDIO_CLIPS = 48
+AUDIO_CLIP_SECONDS = 3.5
+
+VOCAB_SIZE = 2000
+SEED = 0
+
+def _tiny_models(model_dir):
+    '''
+    Small untrained Keras models with the input/output shapes of the real ones
+    '''
+    from tensorflow import keras
+
+    face = keras.Sequential([
+        keras.Input((48, 48, 1)),
+        keras.layers.Conv2D(8, 3, activation='relu'),
+        keras.layers.MaxPooling2D(4),
+        keras.layers.Flatten(),
+        keras.layers.Dense(len(EMOTION_LABELS), activation='softmax')
+    ])
+    text = keras.Sequential([
+        keras.Input((100,)),
+        keras.layers.Embedding(VOCAB_SIZE, 16),
+        keras.layers.GlobalAveragePooling1D(),
+        keras.layers.Dense(len(TEXT_EMOTION_MAPPING), activation='softmax')
+    ])
+    audio = keras.Sequential([
+        keras.Input((40,)),
+        keras.layers.Dense(32, activation='relu'),
+        keras.layers.Dense(len(AUDIO_EMOTION_MAPPING), activation='softmax')
+    ])
+
+    for modality, model in (('face', face), ('text', text), ('audio', audio)):
+        model.save(os.path.join(model_dir, MODEL_FILES[modality]['model']))
+
+def _label_encoders(model_dir):
+    from sklearn.preprocessing import LabelEncoder
+
+    for modality, mapping in (('text', TEXT_EMOTION_MAPPING), ('audio', AUDIO_EMOTION_MAPPING)):
+        encoder = LabelEncoder().fit(list(mapping))
+        with open(os.path.join(model_dir, MODEL_FILES[modality]['label_encoder']), 'wb') as f:
+            pickle.dump(encoder, f)
+
+def _vocabulary(model_dir):
+    from ml.text_vocab import VocabTokenizer
+    words = [f'w{i}' for i in range(VOCAB_SIZE - 1)]
+    VocabTokenizer(words, oov_index=1).save(os.path.join(model_dir, MODEL_FILES['text']['tokenizer']))
+    return words
+
+def _face_image(rng, width=640, height=480):
+    import cv2
+    image = rng.integers(0, 256, (height, width), dtype=np.uint8)
+    # A bright oval gives the cascade something face-like to reject or accept
+    cv2.ellipse(image, (width // 2, height // 2), (90, 120), 0, 0, 360, 200, -1)
+    ok, encoded = cv2.imencode('.jpg', image)
+    return encoded.tobytes()
+
+def _tone(rng, seconds, sr=AUDIO_SAMPLE_RATE):
+    t = np.arange(int(seconds * sr)) / sr
+    frequency = rng.uniform(120, 400)
+    signal = 0.3 * np.sin(2 * np.pi * frequency * t) + 0.02 * rng.standard_normal(len(t))
+    return signal.astype(np.float32)
+
+def _datasets(datasets_dir, words, rng):
+    import soundfile as sf
+
+    pixels = rng.integers(0, 256, (FER_ROWS, 48 * 48))
+    pd.DataFrame({
+        'emotion': rng.integers(0, len(EMOTION_LABELS), FER_ROWS),
+        'pixels': [' '.join(map(str, row)) for row in pixels],
+        'Usage': 'Training'
+    }).to_csv(os.path.join(datasets_dir, 'fer2013.csv'), index=False)
+
+    labels = list(TEXT_EMOTION_MAPPING)
+    pd.DataFrame({
+        'text': [' '.join(rng.choice(words, rng.integers(5, 30))) for _ in range(TEXT_ROWS)],
+        'label': rng.choice(labels, TEXT_ROWS)
+    }).to_csv(os.path.join(datasets_dir, 'text.csv'), index=False)
+
+    clip_dir = os.path.join(datasets_dir, 'audio')
+    os.makedirs(clip_dir, exist_ok=True)
+    paths = []
+    for i in range(AUDIO_CLIPS):
+        path = os.path.join(clip_dir, f'clip{i}.wav')
+        sf.write(path, _tone(rng, AUDIO_CLIP_SECONDS), AUDIO_SAMPLE_RATE)
+        paths.append(path)
+    pd.DataFrame({
+        'file_path': paths,
+        'emotion': rng.choice(list(AUDIO_EMOTION_MAPPING), AUDIO_CLIPS)
+    }).to_csv(os.path.join(datasets_dir, 'emotion.csv'), index=False)
+
+def build_workspace(root):
+    '''
+    Create stand-in models, datasets and request inputs under root
+
+    The layout mirrors the repository (static/models, datasets), so the app
+    and the training loaders work unchanged with root as the working
+    directory. Everything is generated from a fixed seed.
+    '''
+    import io
+    import soundfile as sf
+
+    rng = np.random.default_rng(SEED)
+    model_dir = os.path.join(root, MODEL_DIR)
+    datasets_dir = os.path.join(root, 'datasets')
+    inputs_dir = os.path.join(root, 'inputs')
+    for path in (model_dir, datasets_dir, inputs_dir):
+        os.makedirs(path, exist_ok=True)
+
+    _tiny_models(model_dir)
+    _label_encoders(model_dir)
+    words = _vocabulary(model_dir)
+    _datasets(datasets_dir, words, rng)
+
+    with open(os.path.join(inputs_dir, 'face.jpg'), 'wb') as f:
+        f.write(_face_image(rng))
+    buffer = io.BytesIO()
+    sf.write(buffer, _tone(rng, 4.0), AUDIO_SAMPLE_RATE, format='WAV')
+    with open(os.path.join(inputs_dir, 'clip.wav'), 'wb') as f:
+        f.write(buffer.getvalue())
+    # Distinct texts so the prediction cache is not what gets measured
+    texts = [' '.join(rng.choice(words, 20)) for _ in range(1000)]
+    with open(os.path.join(inputs_dir, 'texts.txt'), 'w') as f:
+        f.write('\n'.join(texts))
+
+    return root
+
+def load_inputs(root):
+    '''
+    Request payloads for each modality, read once
+    '''
+    inputs_dir = os.path.join(root, 'inputs')
+    with open(os.path.join(inputs_dir, 'face.jpg'), 'rb') as f:
+        face = f.read()
+    with open(os.path.join(inputs_dir, 'clip.wav'), 'rb') as f:
+        audio = f.read()
+    with open(os.path.join(inputs_dir, 'texts.txt')) as f:
+        texts = f.read().split('\n')
+    return {'face': face, 'text': texts, 'audio': audio}
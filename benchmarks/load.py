@@ -0,0 +1,167 @@
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.fixtures import load_inputs
+
+MODES = ('threads', 'processes')
+
+# Settings the benchmarked app starts with unless already set in the environment
+APP_ENV = {
+    'PREDICTION_CACHE': 'none',
+    'ASYNC_DETECTION': '0',
+    'TF_CPP_MIN_LOG_LEVEL': '3',
+}
+
+BENCH_USER = {'username': 'bench', 'email': 'bench@example.com', 'password': 'bench'}
+
+_app = None
+_inputs = None
+_local = threading.local()
+
+def peak_rss_mb(children=False):
+    '''
+    Peak resident set size of this process (or its finished children) in MB
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+def load_app(workspace):
+    '''
+    Import the Flask app against the workspace database and models
+    '''
+    global _app, _inputs
+    if _app is not None:
+        return _app
+
+    os.chdir(workspace)
+    for name, value in APP_ENV.items():
+        os.environ.setdefault(name, value)
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(workspace, 'bench.db'))
+
+    import app as flask_app
+    from models.migrations import upgrade_schema
+
+    with flask_app.app.app_context():
+        upgrade_schema()
+    flask_app.app.config['TESTING'] = True
+
+    client = flask_app.app.test_client()
+    client.post('/register', data=BENCH_USER)
+
+    _app = flask_app.app
+    _inputs = load_inputs(workspace)
+    return _app
+
+def _client():
+    # Test clients keep a cookie jar, so each thread logs in with its own
+    client = getattr(_local, 'client', None)
+    if client is None:
+        client = _app.test_client()
+        client.post('/login', data={'email': BENCH_USER['email'], 'password': BENCH_USER['password']})
+        _local.client = client
+    return client
+
+def _request(modality, i):
+    if modality == 'face':
+        data = {'detection_type': 'face', 'face_file': (io.BytesIO(_inputs['face']), 'face.jpg')}
+    elif modality == 'audio':
+        data = {'detection_type': 'audio', 'audio_file': (io.BytesIO(_inputs['audio']), 'clip.wav')}
+    else:
+        texts = _inputs['text']
+        data = {'detection_type': 'text', 'text_input': texts[i % len(texts)]}
+    return data
+
+def timed_request(modality, i):
+    '''
+    POST one detection and return (latency in ms, ok)
+    '''
+    client = _client()
+    data = _request(modality, i)
+    started = time.perf_counter()
+    response = client.post('/detect', data=data, content_type='multipart/form-data')
+    elapsed = (time.perf_counter() - started) * 1000.0
+    ok = response.status_code == 200 and 'error' not in (response.get_json(silent=True) or {})
+    return elapsed, ok
+
+def summarize(latencies, failures, wall_seconds):
+    latencies = np.asarray(latencies)
+    if not len(latencies):
+        return {'requests': 0, 'errors': failures}
+    return {
+        'requests': int(len(latencies)),
+        'errors': int(failures),
+        'latency_ms_mean': float(latencies.mean()),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'throughput_per_s': len(latencies) / wall_seconds if wall_seconds else None,
+    }
+
+def _warm_up(modality):
+    # Load the model and compile the predict graph outside the measurement
+    for i in range(3):
+        timed_request(modality, i)
+
+def run_threads(workspace, modality, requests, concurrency):
+    load_app(workspace)
+    _warm_up(modality)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        results = list(executor.map(lambda i: timed_request(modality, i), range(requests)))
+        wall = time.perf_counter() - started
+
+    report = summarize([r[0] for r in results], sum(not r[1] for r in results), wall)
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+def _init_process(workspace, modality):
+    load_app(workspace)
+    _warm_up(modality)
+
+def _process_chunk(modality, indices):
+    results = [timed_request(modality, i) for i in indices]
+    return results, peak_rss_mb()
+
+def run_processes(workspace, modality, requests, concurrency):
+    '''
+    One app instance per worker process, like a pre-forked server
+    '''
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=concurrency, mp_context=context,
+                             initializer=_init_process, initargs=(workspace, modality)) as executor:
+        # Start every worker (and its warm-up) before the clock starts
+        list(executor.map(_process_chunk, [modality] * concurrency, [[]] * concurrency))
+
+        chunks = np.array_split(np.arange(requests), concurrency * 4)
+        started = time.perf_counter()
+        outputs = list(executor.map(_process_chunk, [modality] * len(chunks), [c.tolist() for c in chunks]))
+        wall = time.perf_counter() - started
+
+    results = [r for chunk, _ in outputs for r in chunk]
+    report = summarize([r[0] for r in results], sum(not r[1] for r in results), wall)
+    rss = [value for _, value in outputs if value is not None]
+    report['peak_rss_mb'] = max(rss) if rss else None
+    return report
+
+def run_load(workspace, modality, requests=200, concurrency=4, mode='threads'):
+    '''
+    Drive /detect for one modality and report latency percentiles and throughput
+    '''
+    if mode not in MODES:
+        raise ValueError(f'mode must be one of {MODES}')
+    runner = run_threads if mode == 'threads' else run_processes
+    report = runner(workspace, modality, requests, concurrency)
+    report.update(modality=modality, mode=mode, concurrency=concurrency)
+    return report
@@ -0,0 +1,85 @@
+import os
+import shutil
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import load_inputs
+
+# Timed calls per microbenchmark; the minimum and median are reported
+REPEAT = 5
+
+def time_call(fn, repeat=REPEAT, setup=None):
+    '''
+    Run fn `repeat` times (after setup, untimed) and report wall time in ms
+    '''
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return {
+        'runs': repeat,
+        'ms_min': float(np.min(timings)),
+        'ms_median': float(np.median(timings)),
+    }
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def bench_loaders(workspace, repeat=REPEAT):
+    '''
+    Training data loaders, from scratch and with their on-disk caches warm
+    '''
+    from ml.train_face import load_fer2013, fer2013_cache_paths
+    from ml.train_audio import load_audio_data
+
+    fer_csv = os.path.join(workspace, 'datasets', 'fer2013.csv')
+    audio_csv = os.path.join(workspace, 'datasets', 'emotion.csv')
+    feature_cache = os.path.join(workspace, 'datasets', 'feature_cache', 'audio')
+
+    return {
+        'load_fer2013_cold': time_call(
+            lambda: load_fer2013(fer_csv), repeat,
+            setup=lambda: _remove(*fer2013_cache_paths(fer_csv))
+        ),
+        'load_fer2013_warm': time_call(lambda: load_fer2013(fer_csv), repeat),
+        'load_audio_data_cold': time_call(
+            lambda: load_audio_data(audio_csv, cache_dir=feature_cache), repeat,
+            setup=lambda: _remove(feature_cache)
+        ),
+        'load_audio_data_warm': time_call(lambda: load_audio_data(audio_csv, cache_dir=feature_cache), repeat),
+    }
+
+def bench_preprocessing(workspace, repeat=REPEAT):
+    '''
+    Per-request preprocessing of each modality, on in-memory uploads
+    '''
+    from ml.predict import preprocess_face, preprocess_text, preprocess_texts, preprocess_audio
+    from ml.media import load_audio
+    from ml.mfcc import mfcc_means
+
+    previous = os.getcwd()
+    # The text tokenizer is resolved from static/models in the workspace
+    os.chdir(workspace)
+    try:
+        inputs = load_inputs(workspace)
+        texts = inputs['text'][:64]
+        preprocess_text(texts[0])
+        clips = [load_audio(inputs['audio'])[0]] * 32
+
+        return {
+            'preprocess_face': time_call(lambda: preprocess_face(inputs['face']), repeat * 4),
+            'preprocess_text': time_call(lambda: preprocess_text(texts[0]), repeat * 4),
+            'preprocess_texts_64': time_call(lambda: preprocess_texts(texts), repeat * 4),
+            'preprocess_audio': time_call(lambda: preprocess_audio(inputs['audio']), repeat * 4),
+            'mfcc_means_32': time_call(lambda: mfcc_means(clips), repeat * 4),
+        }
+    finally:
+        os.chdir(previous)
@@ -5,5 +5,80 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///pysra.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = 'static/uploads'
+    # Uploads are decoded in memory; set SAVE_UPLOADS=1 to also keep a copy on disk
+    SAVE_UPLOADS = os.environ.get('SAVE_UPLOADS', '0') == '1'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'wav', 'mp3', 'csv', 'txt'}
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS') or 10000)  # per /api/detect/batch request
+    # Total uncompressed size of the images and clips in a batch ZIP
+    BATCH_MAX_UNCOMPRESSED_BYTES = int(os.environ.get('BATCH_MAX_UNCOMPRESSED_BYTES') or 4 * MAX_CONTENT_LENGTH)
+
+    # Emotion log persistence: 'buffered' writes behind in bulk, 'sync' commits per detection
+    LOG_WRITE_MODE = os.environ.get('LOG_WRITE_MODE') or 'buffered'
+    LOG_FLUSH_ROWS = int(os.environ.get('LOG_FLUSH_ROWS') or 100)
+    LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL') or 1.0)  # seconds
+    LOG_MAX_PENDING = int(os.environ.get('LOG_MAX_PENDING') or 10000)  # then writes are synchronous
+
+    # Pragmas applied to each connection when the database is SQLite
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'  # FULL for fsync per commit
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+
+    # Merge concurrent predictions into batched model calls (ml/batching.py)
+    INFERENCE_BATCHING = os.environ.get('INFERENCE_BATCHING', '0') == '1'
+    INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE') or 16)
+    INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS') or 8)
+
+    # Text cascade: the TF-IDF model trained next to the BiLSTM answers texts it is at
+    # least TEXT_CASCADE_THRESHOLD sure about; the rest go to the BiLSTM
+    TEXT_CASCADE = os.environ.get('TEXT_CASCADE', '1') == '1'
+    TEXT_CASCADE_THRESHOLD = float(os.environ.get('TEXT_CASCADE_THRESHOLD') or 0.9)
+
+    # Prediction cache in front of predict_emotion: 'memory', 'sqlite' or 'none'
+    PREDICTION_CACHE = os.environ.get('PREDICTION_CACHE') or 'memory'
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE') or 1024)
+    PREDICTION_CACHE_TTL = int(os.environ.get('PREDICTION_CACHE_TTL') or 3600)  # seconds
+    PREDICTION_CACHE_PATH = os.environ.get('PREDICTION_CACHE_PATH') or 'prediction_cache.db'
+
+    # Run audio (and large image) predictions in worker processes and answer
+    # /detect with a job id; results are served from /api/jobs/<id>
+    ASYNC_DETECTION = os.environ.get('ASYNC_DETECTION', '0') == '1'
+    ASYNC_JOB_BROKER = os.environ.get('ASYNC_JOB_BROKER') or 'memory'  # 'memory' or 'sqlite'
+    ASYNC_JOB_DB_PATH = os.environ.get('ASYNC_JOB_DB_PATH') or 'jobs.db'
+    ASYNC_JOB_WORKERS = int(os.environ.get('ASYNC_JOB_WORKERS') or 2)
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL') or 3600)  # seconds a finished job is kept
+    ASYNC_IMAGE_MIN_BYTES = int(os.environ.get('ASYNC_IMAGE_MIN_BYTES') or 2 * 1024 * 1024)
+
+    # Live webcam streams: Haar detection every N frames, face tracking in between
+    FACE_STREAM_DETECT_EVERY = int(os.environ.get('FACE_STREAM_DETECT_EVERY') or 5)
+    FACE_STREAM_SESSION_TTL = int(os.environ.get('FACE_STREAM_SESSION_TTL') or 60)  # seconds idle
+
+    # Live dashboard (Server-Sent Events): commits in this process are pushed at once,
+    # other workers' are picked up every LIVE_POLL_INTERVAL seconds
+    LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL') or 5.0)
+    # Each open stream holds a server thread: keep them short and few per user
+    LIVE_STREAM_MAX_SECONDS = int(os.environ.get('LIVE_STREAM_MAX_SECONDS') or 30)
+    LIVE_STREAMS_PER_USER = int(os.environ.get('LIVE_STREAMS_PER_USER') or 3)
+
+    # Weight of each modality when fusing a multimodal detection
+    FUSION_WEIGHTS = {
+        'face': float(os.environ.get('FACE_FUSION_WEIGHT') or 1.0),
+        'text': float(os.environ.get('TEXT_FUSION_WEIGHT') or 1.0),
+        'audio': float(os.environ.get('AUDIO_FUSION_WEIGHT') or 1.0),
+    }
+    # Threads scoring the extra modalities of multimodal requests; about 2x the server's threads
+    FUSION_WORKERS = int(os.environ.get('FUSION_WORKERS') or 16)
+
+    # Modalities to load and run once in the background at startup, e.g. 'face,text,audio';
+    # /readyz answers 503 until they are warm
+    WARMUP_MODELS = [m.strip() for m in (os.environ.get('WARMUP_MODELS') or '').split(',') if m.strip()]
+
+    # Per-stage timings and fallback counters served at /metrics (Prometheus text format)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+
+    # 'keras' or 'lite' (TFLite export from ml/export_lite.py) per modality
+    INFERENCE_BACKENDS = {
+        'face': os.environ.get('FACE_BACKEND') or 'keras',
+        'text': os.environ.get('TEXT_BACKEND') or 'keras',
+        'audio': os.environ.get('AUDIO_BACKEND') or 'keras',
+    }
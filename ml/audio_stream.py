@@ -0,0 +1,152 @@
+import numpy as np
+
+from ml.media import load_audio, AUDIO_SAMPLE_RATE
+from ml.mfcc import mfcc_means
+
+# Overlapping analysis windows; 3 s matches what the audio model was trained on
+WINDOW_SECONDS = 3.0
+HOP_SECONDS = 1.5
+
+# Frames read from the source per block, and windows scored per model call
+BLOCK_FRAMES = 65536
+WINDOW_BATCH_SIZE = 32
+
+PCM_DTYPES = {
+    'f32le': np.dtype('<f4'),
+    's16le': np.dtype('<i2'),
+}
+
+class AudioWindowStream:
+    '''
+    Cut an incoming sample stream into overlapping analysis windows
+
+    Samples are fed block by block at any sample rate; they are resampled
+    incrementally to 22050 Hz and only the current window is buffered, so
+    memory does not grow with the length of the recording.
+    '''
+
+    def __init__(self, source_sr, sr=AUDIO_SAMPLE_RATE, window_seconds=WINDOW_SECONDS,
+                 hop_seconds=HOP_SECONDS):
+        self.sr = sr
+        self.window = int(window_seconds * sr)
+        self.hop = int(hop_seconds * sr)
+        import soxr
+        self._resampler = soxr.ResampleStream(source_sr, sr, 1, dtype='float32') if source_sr != sr else None
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._start = 0  # absolute sample index of _buffer[0]
+        self.windows = 0
+
+    def _emit(self, samples):
+        start = self._start / self.sr
+        self.windows += 1
+        return start, start + len(samples) / self.sr, samples
+
+    def feed(self, samples, last=False):
+        '''
+        Add mono float samples; yields (start_s, end_s, samples) per completed window
+        '''
+        samples = np.asarray(samples, dtype=np.float32)
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples, last=last)
+        self._buffer = np.concatenate([self._buffer, samples])
+
+        while len(self._buffer) >= self.window:
+            yield self._emit(self._buffer[:self.window])
+            self._buffer = self._buffer[self.hop:]
+            self._start += self.hop
+
+    def flush(self):
+        '''
+        Drain the resampler and emit a final partial window
+
+        The tail is scored when the clip was shorter than one window or when
+        it holds samples no previous window covered.
+        '''
+        if self._resampler is not None:
+            yield from self.feed(np.zeros(0, dtype=np.float32), last=True)
+            self._resampler = None
+
+        uncovered = len(self._buffer) > self.window - self.hop
+        if len(self._buffer) and (self.windows == 0 or uncovered):
+            yield self._emit(self._buffer)
+        self._buffer = self._buffer[:0]
+
+def to_mono(block):
+    return block.mean(axis=1) if block.ndim > 1 else block
+
+def file_blocks(source, block_frames=BLOCK_FRAMES):
+    '''
+    Read a file path or file-like object block by block
+
+    Yields the sample rate first, then mono float32 blocks. Formats
+    libsndfile cannot stream fall back to decoding the whole clip.
+    '''
+    import soundfile as sf
+
+    try:
+        f = sf.SoundFile(source)
+    except Exception:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        audio, sr = load_audio(source, duration=None)
+        yield sr
+        for start in range(0, len(audio), block_frames):
+            yield audio[start:start + block_frames]
+        return
+
+    with f:
+        yield f.samplerate
+        for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            yield to_mono(block)
+
+def pcm_blocks(chunks, dtype='f32le', channels=1):
+    '''
+    Decode raw little-endian PCM byte chunks (e.g. a chunked upload) into mono floats
+    '''
+    dtype = PCM_DTYPES[dtype]
+    frame_bytes = dtype.itemsize * channels
+    pending = b''
+
+    for chunk in chunks:
+        pending += chunk
+        usable = len(pending) - len(pending) % frame_bytes
+        if not usable:
+            continue
+        samples = np.frombuffer(pending[:usable], dtype=dtype).reshape(-1, channels)
+        pending = pending[usable:]
+        if dtype.kind == 'i':
+            samples = samples.astype(np.float32) / np.iinfo(dtype).max
+        yield to_mono(samples.astype(np.float32, copy=False))
+
+def analyze_stream(blocks, source_sr, score_windows, window_seconds=WINDOW_SECONDS,
+                   hop_seconds=HOP_SECONDS, batch_size=WINDOW_BATCH_SIZE):
+    '''
+    Score overlapping windows of a block stream through the audio model
+
+    score_windows maps an (n, 40) array of window vectors to (n, classes)
+    probabilities. The MFCCs of each batch of windows are computed in one
+    vectorized pass. Returns the per-window probabilities and their spans.
+    '''
+    stream = AudioWindowStream(source_sr, window_seconds=window_seconds, hop_seconds=hop_seconds)
+    spans, pending, probabilities = [], [], []
+
+    def score():
+        if pending:
+            probabilities.append(score_windows(mfcc_means(pending, stream.sr)))
+            pending.clear()
+
+    def collect(windows):
+        for start, end, samples in windows:
+            spans.append((start, end))
+            pending.append(samples)
+            if len(pending) >= batch_size:
+                score()
+
+    for block in blocks:
+        collect(stream.feed(block))
+    collect(stream.flush())
+    score()
+
+    if not probabilities:
+        return np.zeros((0, 0)), spans
+    return np.concatenate(probabilities), spans
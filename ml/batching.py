@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+# Defaults tuned for interactive /detect traffic
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 8
+
+# Number of recent queue waits kept for percentile reporting
+WAIT_SAMPLES = 1000
+
+class BatchStats:
+    '''
+    Counters describing how well requests are being merged into batches
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.errors = 0
+        self.batch_sizes = {}
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.recent_waits_ms = deque(maxlen=WAIT_SAMPLES)
+
+    def record(self, batch_size, waits_ms, failed=False):
+        with self._lock:
+            self.batches += 1
+            self.requests += batch_size
+            if failed:
+                self.errors += 1
+            self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+            self.wait_total_ms += sum(waits_ms)
+            self.wait_max_ms = max(self.wait_max_ms, max(waits_ms))
+            self.recent_waits_ms.extend(waits_ms)
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self.recent_waits_ms)
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'errors': self.errors,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+                'queue_wait_ms': {
+                    'mean': self.wait_total_ms / self.requests if self.requests else 0.0,
+                    'max': self.wait_max_ms,
+                    'p50': _percentile(waits, 50),
+                    'p95': _percentile(waits, 95),
+                },
+            }
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+class _Pending:
+    __slots__ = ('x', 'future', 'enqueued_at')
+
+    def __init__(self, x):
+        self.x = x
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class MicroBatcher:
+    '''
+    Merge concurrent single-sample predictions into batched model calls
+
+    Callers submit one preprocessed sample and get a Future for its row of
+    the batched output. A background thread flushes the queue once
+    max_batch_size samples are waiting or the oldest one has waited
+    max_wait_ms, whichever comes first.
+    '''
+
+    def __init__(self, predict_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, name='batcher'):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.name = name
+        self.stats = BatchStats()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, x):
+        '''
+        Queue one sample; returns a Future resolving to its prediction row
+        '''
+        self._ensure_started()
+        pending = _Pending(x)
+        self._queue.put(pending)
+        return pending.future
+
+    def predict(self, x, timeout=None):
+        return self.submit(x).result(timeout=timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f'{self.name}-batcher', daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Past the deadline: take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            waits_ms = [(started - item.enqueued_at) * 1000.0 for item in batch]
+
+            try:
+                predictions = self.predict_fn(np.stack([item.x for item in batch]))
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                self.stats.record(len(batch), waits_ms, failed=True)
+                continue
+
+            for item, row in zip(batch, predictions):
+                item.future.set_result(row)
+            self.stats.record(len(batch), waits_ms)
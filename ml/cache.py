@@ -0,0 +1,215 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 3600  # seconds
+
+# Read uploads in blocks when hashing so large files are not held twice
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def normalize_text(text):
+    '''
+    Collapse whitespace and case, which the text tokenizer ignores anyway
+    '''
+    return ' '.join(text.split()).lower()
+
+def cache_key(model_type, input_data, model_version):
+    '''
+    Content hash of an input plus the model version that scored it
+
+    Text is hashed after normalization; anything else is treated as an
+    upload and hashed by its bytes (a file path or an in-memory buffer).
+    '''
+    digest = hashlib.sha256()
+    digest.update(f'{model_type}:{model_version}:'.encode('utf-8'))
+
+    if model_type == 'text':
+        digest.update(normalize_text(input_data).encode('utf-8'))
+    elif isinstance(input_data, (bytes, bytearray, memoryview)):
+        digest.update(input_data)
+    elif hasattr(input_data, 'read'):
+        position = input_data.tell()
+        for block in iter(lambda: input_data.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+        input_data.seek(position)
+    else:
+        with open(input_data, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+
+    return digest.hexdigest()
+
+class MemoryCacheBackend:
+    '''
+    In-process LRU with a size bound and per-entry TTL
+    '''
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        Returns (value, expired); value is None on a miss
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            value, stored_at = entry
+            if self.ttl and time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None, True
+            self._entries.move_to_end(key)
+            return value, False
+
+    def set(self, key, value):
+        '''
+        Store a value; returns the number of entries evicted to make room
+        '''
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SqliteCacheBackend:
+    '''
+    On-disk LRU that keeps the cache warm across restarts
+    '''
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                key TEXT PRIMARY KEY,
+                emotion TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS ix_prediction_cache_accessed ON prediction_cache (accessed_at)'
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT emotion, confidence, stored_at FROM prediction_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None, False
+            emotion, confidence, stored_at = row
+            if self.ttl and now - stored_at > self.ttl:
+                self._conn.execute('DELETE FROM prediction_cache WHERE key = ?', (key,))
+                return None, True
+            self._conn.execute('UPDATE prediction_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            return (emotion, confidence), False
+
+    def set(self, key, value):
+        now = time.time()
+        emotion, confidence = value
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?, ?)',
+                (key, emotion, confidence, now, now)
+            )
+            excess = self._count() - self.max_entries
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                'DELETE FROM prediction_cache WHERE key IN '
+                '(SELECT key FROM prediction_cache ORDER BY accessed_at LIMIT ?)',
+                (excess,)
+            )
+            return excess
+
+    def _count(self):
+        # Callers hold self._lock
+        return self._conn.execute('SELECT COUNT(*) FROM prediction_cache').fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM prediction_cache')
+
+class PredictionCache:
+    '''
+    Hit/miss bookkeeping in front of a cache backend
+    '''
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        value, expired = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                self.expirations += int(expired)
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        evicted = self.backend.set(key, value)
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'max_entries': self.backend.max_entries,
+            'ttl': self.backend.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+def create_cache(backend='memory', max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, path=None):
+    '''
+    Build a PredictionCache for a backend name ('memory', 'sqlite' or 'none')
+    '''
+    if not backend or backend == 'none':
+        return None
+    if backend == 'memory':
+        return PredictionCache(MemoryCacheBackend(max_entries, ttl))
+    if backend == 'sqlite':
+        return PredictionCache(SqliteCacheBackend(path or 'prediction_cache.db', max_entries, ttl))
+    raise ValueError(f'Unknown prediction cache backend: {backend}')
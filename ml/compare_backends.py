@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from ml.registry import MODEL_DIR, MODEL_FILES, load_artifact
+from ml.export_lite import lite_path
+
+# Repeats when timing single-sample latency
+LATENCY_RUNS = 200
+THROUGHPUT_BATCH = 64
+
+def rss_mb():
+    '''
+    Current resident set size in MB (Linux), or None where unavailable
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _label_encoder(modality, model_dir):
+    with open(os.path.join(model_dir, MODEL_FILES[modality]['label_encoder']), 'rb') as f:
+        return pickle.load(f)
+
+def load_holdout(modality, datasets_dir='datasets', model_dir=MODEL_DIR):
+    '''
+    The validation split used during training (same test_size and seed)
+    '''
+    if modality == 'face':
+        from ml.train_face import load_fer2013_arrays
+        pixels, labels = load_fer2013_arrays(os.path.join(datasets_dir, 'fer2013.csv'))
+        _, val_idx = train_test_split(np.arange(len(labels)), test_size=0.2, random_state=42)
+        X = (pixels[np.sort(val_idx)].astype(np.float32) / 255.0)[..., np.newaxis]
+        return X, labels[np.sort(val_idx)].astype(int)
+
+    if modality == 'text':
+        from ml.train_text import load_text_data
+        from ml.text_vocab import VocabTokenizer
+        texts, emotions = load_text_data(os.path.join(datasets_dir, 'text.csv'))
+        tokenizer = VocabTokenizer.load(os.path.join(model_dir, MODEL_FILES['text']['tokenizer']))
+        X = tokenizer.encode_batch([str(text) for text in texts])
+        y = _label_encoder('text', model_dir).transform(emotions)
+        _, X_val, _, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
+        return X_val, y_val
+
+    if modality == 'audio':
+        from ml.train_audio import load_audio_data
+        X, emotions = load_audio_data(os.path.join(datasets_dir, 'emotion.csv'))
+        y = _label_encoder('audio', model_dir).transform(emotions)
+        _, X_val, _, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
+        return X_val, y_val
+
+    raise ValueError(f'Unknown modality: {modality}')
+
+def measure(model, X, y):
+    '''
+    Accuracy, predictions and latency of one backend on a held-out set
+    '''
+    X = np.asarray(X)
+    predictions = np.concatenate([
+        model.predict(X[start:start + THROUGHPUT_BATCH], verbose=0)
+        for start in range(0, len(X), THROUGHPUT_BATCH)
+    ])
+    predicted = np.argmax(predictions, axis=1)
+
+    # Single-sample latency, as served by /detect without batching
+    model.predict(X[:1], verbose=0)
+    timings = []
+    for i in range(min(LATENCY_RUNS, len(X))):
+        started = time.perf_counter()
+        model.predict(X[i:i + 1], verbose=0)
+        timings.append((time.perf_counter() - started) * 1000.0)
+
+    started = time.perf_counter()
+    batches = 0
+    for start in range(0, len(X), THROUGHPUT_BATCH):
+        model.predict(X[start:start + THROUGHPUT_BATCH], verbose=0)
+        batches += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'accuracy': float(np.mean(predicted == y)),
+        'latency_ms_p50': float(np.percentile(timings, 50)),
+        'latency_ms_p95': float(np.percentile(timings, 95)),
+        'throughput_per_s': len(X) / elapsed if elapsed else None,
+    }, predicted
+
+def compare(modality, datasets_dir='datasets', model_dir=MODEL_DIR):
+    '''
+    Keras vs TFLite metrics for one modality
+    '''
+    X, y = load_holdout(modality, datasets_dir, model_dir)
+    keras_path = os.path.join(model_dir, MODEL_FILES[modality]['model'])
+    report = {'modality': modality, 'samples': len(X)}
+
+    predicted = {}
+    for backend, path in (('keras', keras_path), ('lite', lite_path(keras_path))):
+        before = rss_mb()
+        model = load_artifact(path)
+        after = rss_mb()
+
+        metrics, predicted[backend] = measure(model, X, y)
+        metrics['file_kb'] = os.path.getsize(path) / 1024
+        metrics['load_rss_mb'] = after - before if before is not None else None
+        report[backend] = metrics
+        del model
+
+    report['delta'] = {
+        'accuracy': report['lite']['accuracy'] - report['keras']['accuracy'],
+        'agreement': float(np.mean(predicted['keras'] == predicted['lite'])),
+        'latency_speedup': report['keras']['latency_ms_p50'] / report['lite']['latency_ms_p50'],
+        'size_ratio': report['lite']['file_kb'] / report['keras']['file_kb'],
+    }
+    return report
+
+def print_report(report):
+    print(f"\n{report['modality']} ({report['samples']} held-out samples)")
+    print(f"{'backend':<8}{'accuracy':>10}{'p50 ms':>10}{'p95 ms':>10}{'per s':>10}{'file KB':>10}{'RSS MB':>10}")
+    for backend in ('keras', 'lite'):
+        m = report[backend]
+        rss = f"{m['load_rss_mb']:.1f}" if m['load_rss_mb'] is not None else '-'
+        print(f"{backend:<8}{m['accuracy']:>10.4f}{m['latency_ms_p50']:>10.2f}{m['latency_ms_p95']:>10.2f}"
+              f"{m['throughput_per_s']:>10.0f}{m['file_kb']:>10.0f}{rss:>10}")
+    d = report['delta']
+    print(f"accuracy delta {d['accuracy']:+.4f}, agreement {d['agreement']:.2%}, "
+          f"p50 speedup {d['latency_speedup']:.2f}x, size {d['size_ratio']:.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare Keras and TFLite backends on held-out data')
+    parser.add_argument('modalities', nargs='*', default=list(MODEL_FILES), help='face, text and/or audio')
+    parser.add_argument('--datasets-dir', default='datasets')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--json', help='also write the reports to this file')
+    args = parser.parse_args()
+
+    reports = [compare(modality, args.datasets_dir, args.model_dir) for modality in args.modalities]
+    for report in reports:
+        print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
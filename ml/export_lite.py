@@ -0,0 +1,54 @@
+import argparse
+import os
+
+import tensorflow as tf
+from tensorflow import keras
+
+from ml.registry import MODEL_DIR, MODEL_FILES
+
+QUANTIZATIONS = ('none', 'float16', 'int8')
+
+def lite_path(model_path):
+    return os.path.splitext(model_path)[0] + '.tflite'
+
+def export_lite(model_path, quantization='float16', output_path=None):
+    '''
+    Convert a Keras .h5 model to TFLite
+
+    quantization: 'none' keeps float32 weights, 'float16' halves them and
+    'int8' applies dynamic-range quantization (int8 weights, float
+    activations), which needs no calibration data.
+    '''
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f'quantization must be one of {QUANTIZATIONS}')
+
+    model = keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization != 'none':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+
+    # The BiLSTM may need TensorFlow kernels for ops without a builtin
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS
+    ]
+
+    output_path = output_path or lite_path(model_path)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+    print(f"Lite model saved to {output_path} ({os.path.getsize(output_path) / 1024:.0f} KB)")
+    return output_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export emotion models to TFLite')
+    parser.add_argument('modalities', nargs='*', default=list(MODEL_FILES), help='face, text and/or audio')
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, default='float16')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    args = parser.parse_args()
+
+    for modality in args.modalities:
+        export_lite(os.path.join(args.model_dir, MODEL_FILES[modality]['model']), args.quantization)
@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+
+# OpenCV is imported on first use so that importing the app stays cheap
+CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+
+# Longest image side used for Haar detection; boxes are mapped back to full size
+DETECTION_MAX_SIDE = 640
+
+FACE_SIZE = 48
+
+# CascadeClassifier is not safe to share between threads, keep one per thread
+_local = threading.local()
+
+def get_cascade():
+    '''
+    Haar cascade for the current thread, loaded from XML only once
+    '''
+    cascade = getattr(_local, 'cascade', None)
+    if cascade is None:
+        import cv2
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + CASCADE_FILE)
+        _local.cascade = cascade
+    return cascade
+
+def detect_faces(gray, max_side=DETECTION_MAX_SIDE, scale_factor=1.3, min_neighbors=5):
+    '''
+    Detect faces on a downscaled copy of a grayscale image
+
+    Returns an (n, 4) int array of x, y, w, h boxes in full-resolution
+    coordinates.
+    '''
+    import cv2
+
+    height, width = gray.shape[:2]
+    scale = min(1.0, float(max_side) / max(height, width))
+
+    if scale < 1.0:
+        small = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+
+    faces = get_cascade().detectMultiScale(small, scale_factor, min_neighbors)
+    if len(faces) == 0:
+        return np.empty((0, 4), dtype=int)
+
+    boxes = np.round(np.asarray(faces, dtype=np.float64) / scale).astype(int)
+    # Rounding can push a box one pixel past the border
+    boxes[:, 2] = np.minimum(boxes[:, 2], width - boxes[:, 0])
+    boxes[:, 3] = np.minimum(boxes[:, 3], height - boxes[:, 1])
+    return boxes
+
+def crop_faces(gray, boxes, size=FACE_SIZE):
+    '''
+    Crop, resize and normalize faces into one (n, size, size, 1) float32 batch
+
+    With no boxes the whole image is used as a single face.
+    '''
+    import cv2
+
+    if len(boxes) == 0:
+        crops = [gray]
+    else:
+        crops = [gray[y:y+h, x:x+w] for x, y, w, h in boxes]
+
+    batch = np.empty((len(crops), size, size), dtype=np.uint8)
+    for i, crop in enumerate(crops):
+        batch[i] = cv2.resize(crop, (size, size))
+
+    return (batch.astype(np.float32) / 255.0)[..., np.newaxis]
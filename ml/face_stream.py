@@ -0,0 +1,231 @@
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from ml.predict import EMOTION_LABELS, run_model
+from ml.media import load_image
+from ml.face import detect_faces, crop_faces
+from ml.batching import MicroBatcher
+from ml.metrics import span
+
+# Re-run the Haar detector every N frames and track the box in between
+DETECT_EVERY = 5
+# Tracking searches the previous box grown by this fraction on each side
+TRACK_MARGIN = 0.5
+# Below this normalized correlation the track is lost and the face re-detected
+TRACK_MIN_SCORE = 0.5
+# Weight of the newest frame in the running probability estimate
+SMOOTHING = 0.3
+# Streams idle for longer than this (seconds) are closed
+SESSION_TTL = 60
+
+# Crops from all live streams share face model calls
+STREAM_MAX_BATCH_SIZE = 16
+STREAM_MAX_WAIT_MS = 5
+
+# Frame outcomes
+OK = 'ok'
+NO_FACE = 'no_face'
+DROPPED = 'dropped'
+
+class FaceTracker:
+    '''
+    Follows one face between Haar detections with template matching
+    '''
+
+    def __init__(self, detect_every=DETECT_EVERY, margin=TRACK_MARGIN, min_score=TRACK_MIN_SCORE):
+        self.detect_every = detect_every
+        self.margin = margin
+        self.min_score = min_score
+        self.box = None
+        self._template = None
+        # Start due, so the first frame is searched
+        self._since_detection = detect_every
+
+    def _detect(self, gray):
+        with span('face_detect', 'stream'):
+            boxes = detect_faces(gray)
+        self._since_detection = 0
+        if not len(boxes):
+            self.box, self._template = None, None
+            return None
+        # Keep the largest face
+        x, y, w, h = max(boxes, key=lambda b: b[2] * b[3])
+        self.box = (int(x), int(y), int(w), int(h))
+        self._template = gray[y:y + h, x:x + w].copy()
+        return self.box
+
+    def _track(self, gray):
+        import cv2
+
+        x, y, w, h = self.box
+        dx, dy = int(w * self.margin), int(h * self.margin)
+        x0, y0 = max(0, x - dx), max(0, y - dy)
+        x1, y1 = min(gray.shape[1], x + w + dx), min(gray.shape[0], y + h + dy)
+        region = gray[y0:y1, x0:x1]
+        if region.shape[0] < h or region.shape[1] < w:
+            return None
+
+        with span('face_track', 'stream'):
+            scores = cv2.matchTemplate(region, self._template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (mx, my) = cv2.minMaxLoc(scores)
+        if score < self.min_score:
+            return None
+
+        self.box = (x0 + mx, y0 + my, w, h)
+        return self.box
+
+    def update(self, gray):
+        '''
+        Face box (x, y, w, h) in this frame, or None when there is no face
+        '''
+        self._since_detection += 1
+        if self._since_detection >= self.detect_every:
+            return self._detect(gray)
+        if self.box is None:
+            # No face at the last detection; look again on the next scheduled one
+            return None
+
+        box = self._track(gray)
+        return box if box is not None else self._detect(gray)
+
+class FaceStream:
+    '''
+    One live webcam stream: face tracking plus a running emotion estimate
+
+    Only the newest frame is worth analyzing. When frames arrive faster
+    than they are processed, a waiting frame is dropped as soon as a newer
+    one comes in, and frames older than the last analyzed one are ignored.
+    '''
+
+    def __init__(self, user_id, batcher, detect_every=DETECT_EVERY, smoothing=SMOOTHING):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.batcher = batcher
+        self.smoothing = smoothing
+        self.tracker = FaceTracker(detect_every)
+        self.probabilities = None
+        self.frames = 0
+        self.dropped = 0
+        self.last_seq = -1
+        self.last_seen = time.time()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._waiting = None
+
+    def estimate(self):
+        if self.probabilities is None:
+            return None, 0.0
+        index = int(np.argmax(self.probabilities))
+        return EMOTION_LABELS[index], float(self.probabilities[index])
+
+    def _response(self, status, seq, box=None):
+        emotion, confidence = self.estimate()
+        return {
+            'status': status,
+            'seq': seq,
+            'emotion': emotion,
+            'confidence': confidence,
+            'box': list(box) if box is not None else None,
+            'frames': self.frames,
+            'dropped': self.dropped
+        }
+
+    def submit(self, frame, seq):
+        '''
+        Analyze one encoded frame unless a newer one supersedes it
+        '''
+        self.last_seen = time.time()
+        ticket = {'seq': seq, 'dropped': False}
+
+        with self._cond:
+            if seq <= self.last_seq:
+                self.dropped += 1
+                return self._response(DROPPED, seq)
+            if self._waiting is not None:
+                self._waiting['dropped'] = True
+                self.dropped += 1
+            self._waiting = ticket
+            self._cond.notify_all()
+
+            while self._busy and not ticket['dropped']:
+                self._cond.wait()
+            if ticket['dropped']:
+                return self._response(DROPPED, seq)
+
+            self._waiting = None
+            self._busy = True
+
+        try:
+            return self._process(frame, seq)
+        finally:
+            with self._cond:
+                self._busy = False
+                self.last_seq = max(self.last_seq, seq)
+                self._cond.notify_all()
+
+    def _process(self, frame, seq):
+        with span('load_input', 'stream'):
+            gray = load_image(frame)
+        box = self.tracker.update(gray)
+        self.frames += 1
+        if box is None:
+            return self._response(NO_FACE, seq)
+
+        crop = crop_faces(gray, [box])[0]
+        probabilities = np.asarray(self.batcher.predict(crop), dtype=np.float64)
+        if self.probabilities is None:
+            self.probabilities = probabilities
+        else:
+            self.probabilities = self.smoothing * probabilities + (1 - self.smoothing) * self.probabilities
+        return self._response(OK, seq, box)
+
+class FaceStreamManager:
+    '''
+    Live streams of this process, sharing one micro-batched face model
+    '''
+
+    def __init__(self, detect_every=DETECT_EVERY, session_ttl=SESSION_TTL,
+                 max_batch_size=STREAM_MAX_BATCH_SIZE, max_wait_ms=STREAM_MAX_WAIT_MS):
+        self.detect_every = detect_every
+        self.session_ttl = session_ttl
+        self.batcher = MicroBatcher(
+            lambda batch: run_model('face', batch),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name='face-stream'
+        )
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        cutoff = time.time() - self.session_ttl
+        for stream_id in [sid for sid, s in self._streams.items() if s.last_seen < cutoff]:
+            del self._streams[stream_id]
+
+    def open(self, user_id):
+        stream = FaceStream(user_id, self.batcher, detect_every=self.detect_every)
+        with self._lock:
+            self._expire()
+            self._streams[stream.id] = stream
+        return stream
+
+    def get(self, stream_id, user_id):
+        with self._lock:
+            self._expire()
+            stream = self._streams.get(stream_id)
+        return stream if stream is not None and stream.user_id == user_id else None
+
+    def close(self, stream_id, user_id):
+        stream = self.get(stream_id, user_id)
+        if stream is not None:
+            with self._lock:
+                self._streams.pop(stream_id, None)
+        return stream
+
+    def stats(self):
+        with self._lock:
+            streams = len(self._streams)
+        return {'streams': streams, 'batching': self.batcher.stats.snapshot()}
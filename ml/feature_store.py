@@ -0,0 +1,114 @@
+import glob
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+INDEX_FILE = 'index.json'
+
+def params_digest(params):
+    '''
+    Short stable hash of a dict of extraction parameters
+    '''
+    encoded = json.dumps(params, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+class FeatureStore:
+    '''
+    Memory-mapped on-disk store of per-file feature vectors
+
+    Each set of extraction parameters gets its own directory holding one
+    float32 .npy matrix and an index.json mapping entry keys to rows. A key
+    covers the file's absolute path, mtime and size, so edited or replaced
+    files are extracted again. Writers publish a new matrix under a fresh
+    name and then atomically swap the index, so readers always see a
+    consistent pair.
+    '''
+
+    def __init__(self, root, params, dim):
+        self.params = params
+        self.dim = dim
+        self.directory = os.path.join(root, params_digest(params))
+        os.makedirs(self.directory, exist_ok=True)
+        self._index_path = os.path.join(self.directory, INDEX_FILE)
+        self._load_index()
+
+    def _load_index(self):
+        self.rows = {}
+        self.matrix_file = None
+        self._matrix = None
+        if not os.path.exists(self._index_path):
+            return
+
+        with open(self._index_path) as f:
+            index = json.load(f)
+        self.rows = index['rows']
+        self.matrix_file = index['matrix']
+        self._matrix = np.load(os.path.join(self.directory, self.matrix_file), mmap_mode='r')
+
+    @staticmethod
+    def key(path):
+        '''
+        Entry key for a file, or None if it does not exist
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return f'{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}'
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, keys):
+        '''
+        Feature matrix for stored keys, in the given order
+        '''
+        if not keys:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.asarray(self._matrix[[self.rows[key] for key in keys]])
+
+    def add(self, keys, vectors):
+        '''
+        Append feature vectors for new keys and publish them
+        '''
+        if not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dim)
+        existing = 0 if self._matrix is None else len(self._matrix)
+
+        matrix_file = f'features-{uuid.uuid4().hex[:8]}.npy'
+        matrix = np.lib.format.open_memmap(
+            os.path.join(self.directory, matrix_file), mode='w+',
+            dtype=np.float32, shape=(existing + len(keys), self.dim)
+        )
+        if existing:
+            matrix[:existing] = self._matrix
+        matrix[existing:] = vectors
+        matrix.flush()
+        del matrix
+
+        rows = dict(self.rows)
+        rows.update({key: existing + i for i, key in enumerate(keys)})
+
+        tmp_index = f'{self._index_path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp_index, 'w') as f:
+            json.dump({'params': self.params, 'matrix': matrix_file, 'rows': rows}, f)
+        os.replace(tmp_index, self._index_path)
+
+        self._load_index()
+        self._remove_stale_matrices()
+
+    def _remove_stale_matrices(self):
+        for path in glob.glob(os.path.join(self.directory, 'features-*.npy')):
+            if os.path.basename(path) != self.matrix_file:
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still mapped by another process (or on Windows); try next time
+                    pass
@@ -0,0 +1,153 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ml.predict import (
+    EMOTION_LABELS, TEXT_EMOTION_MAPPING, AUDIO_EMOTION_MAPPING, FALLBACK_PREDICTION,
+    preprocess_face, preprocess_text, preprocess_audio, infer
+)
+from ml.registry import get_model
+from ml.metrics import span, count, record_fallback
+
+logger = logging.getLogger(__name__)
+
+MODALITIES = ('face', 'text', 'audio')
+DEFAULT_WEIGHTS = {'face': 1.0, 'text': 1.0, 'audio': 1.0}
+
+PREPROCESSORS = {'face': preprocess_face, 'text': preprocess_text, 'audio': preprocess_audio}
+
+# Usually slowest first: it runs on the request thread while the others go to the pool
+REQUEST_THREAD_ORDER = ('audio', 'face', 'text')
+
+# Threads for the modalities not run on the request thread; with N server
+# threads, 2 * N keeps concurrent requests from queueing behind each other
+DEFAULT_WORKERS = 16
+
+# Shared by all requests; model calls, OpenCV and the FFTs release the GIL
+_executor = None
+_executor_lock = threading.Lock()
+_workers = DEFAULT_WORKERS
+
+def configure_fusion(workers=DEFAULT_WORKERS):
+    '''
+    Size the thread pool shared by multimodal requests
+    '''
+    global _executor, _workers
+    with _executor_lock:
+        _workers = max(1, workers)
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix='fusion')
+        return _executor
+
+def to_emotion_space(modality, probabilities):
+    '''
+    Map a model's class probabilities onto EMOTION_LABELS
+
+    The face model already predicts EMOTION_LABELS. Text and audio classes
+    go through their label encoder and mapping; classes without an
+    equivalent are dropped and the rest renormalized.
+    '''
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    if modality == 'face':
+        return probabilities
+
+    mapping = TEXT_EMOTION_MAPPING if modality == 'text' else AUDIO_EMOTION_MAPPING
+    classes = get_model(modality).label_encoder.classes_
+
+    vector = np.zeros(len(EMOTION_LABELS))
+    for name, p in zip(classes, probabilities):
+        emotion = mapping.get(str(name).lower(), str(name).capitalize())
+        if emotion in EMOTION_LABELS:
+            vector[EMOTION_LABELS.index(emotion)] += p
+
+    total = vector.sum()
+    return vector / total if total > 0 else vector
+
+def modality_probabilities(modality, input_data):
+    '''
+    Probability vector over EMOTION_LABELS for one input
+    '''
+    sample = PREPROCESSORS[modality](input_data)
+    return to_emotion_space(modality, infer(modality, sample))
+
+def _run(modality, data):
+    try:
+        return modality_probabilities(modality, data), None
+    except Exception as e:
+        return None, e
+
+def fuse(vectors, weights=None):
+    '''
+    Weighted mean of per-modality probability vectors (late fusion)
+    '''
+    weights = weights or DEFAULT_WEIGHTS
+    total = sum(weights.get(modality, 1.0) for modality in vectors)
+    if total <= 0:
+        raise ValueError('Fusion weights of the given modalities sum to zero')
+    return sum(weights.get(modality, 1.0) * vector for modality, vector in vectors.items()) / total
+
+def _result(vector):
+    index = int(np.argmax(vector))
+    return EMOTION_LABELS[index], float(vector[index])
+
+def predict_multimodal(inputs, weights=None):
+    '''
+    Predict from several modalities at once and fuse the results
+
+    inputs maps 'face' / 'text' / 'audio' to the same input predict_emotion
+    takes. The modalities run concurrently, one on the calling thread and
+    the others on the shared pool, so the latency is that of the slowest
+    one. Returns the fused emotion/confidence, the fused probabilities and
+    the per-modality results. A modality that fails is
+    reported with its error and left out of the fusion.
+    '''
+    inputs = {modality: data for modality, data in inputs.items() if modality in MODALITIES}
+    if not inputs:
+        raise ValueError('No face, text or audio input given')
+
+    with span('fusion', 'multimodal'):
+        local = next(modality for modality in REQUEST_THREAD_ORDER if modality in inputs)
+        futures = {
+            modality: _pool().submit(_run, modality, data)
+            for modality, data in inputs.items() if modality != local
+        }
+        outcomes = {local: _run(local, inputs[local])}
+        outcomes.update((modality, future.result()) for modality, future in futures.items())
+
+        vectors, modalities = {}, {}
+        for modality in inputs:
+            vector, e = outcomes[modality]
+            if e is not None:
+                logger.error('Error in %s prediction: %s', modality, e)
+                record_fallback(modality, e)
+                modalities[modality] = {'error': str(e)}
+                continue
+
+            vectors[modality] = vector
+            emotion, confidence = _result(vectors[modality])
+            modalities[modality] = {'emotion': emotion, 'confidence': confidence}
+
+        if vectors:
+            fused = fuse(vectors, weights)
+            emotion, confidence = _result(fused)
+            probabilities = {label: float(p) for label, p in zip(EMOTION_LABELS, fused)}
+        else:
+            emotion, confidence = FALLBACK_PREDICTION
+            probabilities = {}
+
+    count('predictions', modality='multimodal', source='model' if vectors else 'fallback')
+    return {
+        'emotion': emotion,
+        'confidence': confidence,
+        'probabilities': probabilities,
+        'modalities': modalities
+    }
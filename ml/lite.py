@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+
+def _interpreter_class():
+    # The standalone tflite-runtime wheel avoids importing all of TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+class LiteModel:
+    '''
+    TFLite model exposing the subset of the Keras API used by ml.predict
+
+    An interpreter is not thread-safe, so each thread gets its own
+    instance over the same model bytes.
+    '''
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.num_threads = num_threads
+        with open(path, 'rb') as f:
+            self._content = f.read()
+        self._local = threading.local()
+        # Fail fast on a broken file instead of on the first request
+        self._interpreter()
+
+    def _interpreter(self):
+        interpreter = getattr(self._local, 'interpreter', None)
+        if interpreter is None:
+            Interpreter = _interpreter_class()
+            interpreter = Interpreter(model_content=self._content, num_threads=self.num_threads)
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+            self._local.batch_size = interpreter.get_input_details()[0]['shape'][0]
+        return interpreter
+
+    def predict(self, batch, verbose=0):
+        interpreter = self._interpreter()
+        input_detail = interpreter.get_input_details()[0]
+        batch = np.asarray(batch, dtype=input_detail['dtype'])
+
+        if self._local.batch_size != len(batch):
+            interpreter.resize_tensor_input(input_detail['index'], [len(batch)] + list(batch.shape[1:]))
+            interpreter.allocate_tensors()
+            self._local.batch_size = len(batch)
+
+        interpreter.set_tensor(input_detail['index'], batch)
+        interpreter.invoke()
+        return interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
@@ -0,0 +1,61 @@
+import io
+import os
+import tempfile
+
+import numpy as np
+
+# cv2 and librosa are imported on first use so that importing the app stays cheap
+
+AUDIO_SAMPLE_RATE = 22050
+AUDIO_DURATION = 3  # seconds
+
+def _as_bytes(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    data = source.read()
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return data
+
+def load_image(source, flags=None):
+    '''
+    Decode an image from a file path, a bytes buffer or a file-like object
+
+    flags defaults to cv2.IMREAD_GRAYSCALE.
+    '''
+    import cv2
+
+    if flags is None:
+        flags = cv2.IMREAD_GRAYSCALE
+    if isinstance(source, str):
+        img = cv2.imread(source, flags)
+    else:
+        buffer = np.frombuffer(_as_bytes(source), dtype=np.uint8)
+        img = cv2.imdecode(buffer, flags)
+
+    if img is None:
+        raise ValueError('Could not decode image')
+    return img
+
+def load_audio(source, sr=AUDIO_SAMPLE_RATE, duration=AUDIO_DURATION):
+    '''
+    Decode audio from a file path, a bytes buffer or a file-like object
+    '''
+    import librosa
+
+    if isinstance(source, str):
+        return librosa.load(source, sr=sr, duration=duration)
+
+    data = _as_bytes(source)
+    try:
+        return librosa.load(io.BytesIO(data), sr=sr, duration=duration)
+    except Exception:
+        # Formats libsndfile cannot read from memory (e.g. mp3 on older
+        # builds) go through audioread, which needs a real file
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            return librosa.load(path, sr=sr, duration=duration)
+        finally:
+            os.remove(path)
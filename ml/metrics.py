@@ -0,0 +1,154 @@
+import threading
+import time
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = 'pysra'
+
+class Histogram:
+    '''
+    Cumulative-bucket histogram of durations, as exposed by Prometheus
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            yield bound, running
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+class _Span:
+    __slots__ = ('metrics', 'key', 'started')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.key, time.perf_counter() - self.started)
+        return False
+
+class Metrics:
+    '''
+    Stage timings and counters for the prediction hot path
+
+    While disabled, span() returns a shared no-op context manager and
+    count() returns immediately, so instrumented code pays one attribute
+    check per call.
+    '''
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def span(self, stage, modality=''):
+        '''
+        Context manager timing one stage (e.g. 'face_detect') of a modality
+        '''
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, (stage, modality))
+
+    def observe(self, key, seconds):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        '''
+        All metrics in the Prometheus text exposition format
+        '''
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            histograms = [(key, list(h.cumulative()), h.total, h.count) for key, h in histograms]
+            counters = sorted(self._counters.items())
+
+        name = f'{PREFIX}_stage_duration_seconds'
+        lines = [
+            f'# HELP {name} Time spent in each stage of a prediction request.',
+            f'# TYPE {name} histogram',
+        ]
+        for (stage, modality), buckets, total, count in histograms:
+            labels = f'stage="{stage}",modality="{modality}"'
+            for bound, n in buckets:
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+
+        declared = set()
+        for (counter, labels), value in counters:
+            name = f'{PREFIX}_{counter}_total'
+            if name not in declared:
+                lines.append(f'# TYPE {name} counter')
+                declared.add(name)
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f'{name}{{{label_text}}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Process-wide instance used by ml.predict and app.py
+metrics = Metrics()
+
+def configure_metrics(enabled=True):
+    metrics.enabled = enabled
+
+def span(stage, modality=''):
+    return metrics.span(stage, modality)
+
+def count(name, amount=1, **labels):
+    metrics.count(name, amount, **labels)
+
+def record_fallback(modality, error, amount=1):
+    '''
+    Count predictions that returned the fallback because of an error
+    '''
+    metrics.count('prediction_fallbacks', amount, modality=modality)
+    metrics.count('prediction_errors', amount, modality=modality, error=type(error).__name__)
@@ -0,0 +1,196 @@
+import argparse
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from ml.media import AUDIO_SAMPLE_RATE, AUDIO_DURATION
+
+# Parameters of librosa.feature.mfcc(y=..., sr=22050, n_mfcc=40) with its defaults
+N_MFCC = 40
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+AMIN = 1e-10
+TOP_DB = 80.0
+
+# Clips per vectorized STFT pass; bounds the frame buffer to about 35 MB
+MAX_BATCH_CLIPS = 32
+
+# Largest difference to librosa's MFCC means accepted by check_against_librosa()
+TOLERANCE = 1e-3
+
+def _hz_to_mel(frequencies):
+    # Slaney's auditory toolbox scale: linear below 1 kHz, logarithmic above
+    frequencies = np.array(frequencies, dtype=np.float64, ndmin=1)
+    f_sp = 200.0 / 3
+    mels = frequencies / f_sp
+    min_log_hz, min_log_mel, logstep = 1000.0, 1000.0 / f_sp, np.log(6.4) / 27.0
+    log_region = frequencies >= min_log_hz
+    mels[log_region] = min_log_mel + np.log(frequencies[log_region] / min_log_hz) / logstep
+    return mels
+
+def _mel_to_hz(mels):
+    mels = np.array(mels, dtype=np.float64, ndmin=1)
+    f_sp = 200.0 / 3
+    frequencies = f_sp * mels
+    min_log_hz, min_log_mel, logstep = 1000.0, 1000.0 / f_sp, np.log(6.4) / 27.0
+    log_region = mels >= min_log_mel
+    frequencies[log_region] = min_log_hz * np.exp(logstep * (mels[log_region] - min_log_mel))
+    return frequencies
+
+@lru_cache(maxsize=None)
+def mel_filterbank(sr=AUDIO_SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    '''
+    (n_fft // 2 + 1, n_mels) Slaney-normalized triangular filters, as librosa.filters.mel
+    '''
+    fft_frequencies = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    mel_frequencies = _mel_to_hz(np.linspace(_hz_to_mel(0.0)[0], _hz_to_mel(sr / 2.0)[0], n_mels + 2))
+
+    widths = np.diff(mel_frequencies)
+    ramps = mel_frequencies[:, np.newaxis] - fft_frequencies[np.newaxis, :]
+    lower = -ramps[:-2] / widths[:-1, np.newaxis]
+    upper = ramps[2:] / widths[1:, np.newaxis]
+    weights = np.maximum(0, np.minimum(lower, upper))
+
+    # Constant energy per channel
+    weights *= (2.0 / (mel_frequencies[2:] - mel_frequencies[:-2]))[:, np.newaxis]
+    weights = weights.T.astype(np.float32)
+    weights.flags.writeable = False
+    return weights
+
+@lru_cache(maxsize=None)
+def dct_matrix(n_mfcc=N_MFCC, n_mels=N_MELS):
+    '''
+    (n_mels, n_mfcc) orthonormal DCT-II basis, as scipy.fft.dct(norm='ortho')
+    '''
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, np.newaxis]
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+    basis[0] /= np.sqrt(2.0)
+    basis = basis.T
+    basis.flags.writeable = False
+    return basis
+
+@lru_cache(maxsize=None)
+def _window(n_fft=N_FFT):
+    # Periodic Hann, as scipy.signal.get_window('hann', n_fft)
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+def _log_mel_means(clips, sr):
+    # clips: (n, samples) float32 of equal length
+    import scipy.fft
+
+    padded = np.pad(clips, ((0, 0), (N_FFT // 2, N_FFT // 2)))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT, axis=1)[:, ::HOP_LENGTH]
+    # scipy's pocketfft keeps float32 and is several times faster here than numpy.fft
+    spectrum = scipy.fft.rfft(frames * _window(N_FFT), axis=-1, overwrite_x=True)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+
+    mel = power.astype(np.float32) @ mel_filterbank(sr, N_FFT, N_MELS)
+    log_mel = 10.0 * np.log10(np.maximum(AMIN, mel))
+    # Dynamic range is limited per clip, relative to its loudest bin
+    log_mel = np.maximum(log_mel, log_mel.max(axis=(1, 2), keepdims=True) - TOP_DB)
+    return log_mel.mean(axis=1)
+
+def mfcc_means_batch(clips, sr=AUDIO_SAMPLE_RATE, n_mfcc=N_MFCC):
+    '''
+    Time-averaged MFCCs of equal-length clips, shape (n, n_mfcc)
+
+    Matches np.mean(librosa.feature.mfcc(y=clip, sr=sr, n_mfcc=n_mfcc).T, axis=0)
+    per clip. All clips go through one STFT, mel projection and DCT pass
+    (in chunks of MAX_BATCH_CLIPS); the DCT is linear, so it is applied to
+    the time-averaged log-mel spectrum.
+    '''
+    clips = np.atleast_2d(np.asarray(clips, dtype=np.float32))
+    if clips.shape[1] == 0:
+        raise ValueError('Cannot compute MFCCs of an empty clip')
+
+    log_mel = np.concatenate([
+        _log_mel_means(clips[start:start + MAX_BATCH_CLIPS], sr)
+        for start in range(0, len(clips), MAX_BATCH_CLIPS)
+    ])
+    return (log_mel @ dct_matrix(n_mfcc, N_MELS)).astype(np.float32)
+
+def mfcc_means(clips, sr=AUDIO_SAMPLE_RATE, n_mfcc=N_MFCC):
+    '''
+    Time-averaged MFCCs of clips of any lengths, batching clips of the same length
+    '''
+    clips = [np.asarray(clip, dtype=np.float32) for clip in clips]
+    features = np.zeros((len(clips), n_mfcc), dtype=np.float32)
+
+    by_length = {}
+    for i, clip in enumerate(clips):
+        by_length.setdefault(len(clip), []).append(i)
+    for indices in by_length.values():
+        features[indices] = mfcc_means_batch(np.stack([clips[i] for i in indices]), sr, n_mfcc)
+    return features
+
+def mfcc_mean(clip, sr=AUDIO_SAMPLE_RATE, n_mfcc=N_MFCC):
+    '''
+    Time-averaged MFCC vector of one clip
+    '''
+    return mfcc_means_batch(np.asarray(clip, dtype=np.float32)[np.newaxis], sr, n_mfcc)[0]
+
+def check_against_librosa(clips, sr=AUDIO_SAMPLE_RATE, n_mfcc=N_MFCC, tolerance=TOLERANCE):
+    '''
+    Largest absolute difference to librosa's MFCC means over the clips; raises past tolerance
+    '''
+    import librosa
+
+    expected = np.stack([
+        np.mean(librosa.feature.mfcc(y=np.asarray(clip, dtype=np.float32), sr=sr, n_mfcc=n_mfcc).T, axis=0)
+        for clip in clips
+    ])
+    difference = float(np.max(np.abs(mfcc_means(clips, sr, n_mfcc) - expected)))
+    if difference > tolerance:
+        raise AssertionError(f'MFCC means differ from librosa by {difference:.2e} (tolerance {tolerance:.0e})')
+    return difference
+
+def _test_clips(count, seed=0):
+    # Noise, tones, silence and a short clip, at the serving clip length
+    rng = np.random.default_rng(seed)
+    length = AUDIO_SAMPLE_RATE * AUDIO_DURATION
+    t = np.arange(length) / AUDIO_SAMPLE_RATE
+    clips = [np.zeros(length, dtype=np.float32), rng.standard_normal(length // 3).astype(np.float32) * 0.1]
+    while len(clips) < count:
+        tone = np.sin(2 * np.pi * rng.uniform(80, 4000) * t) * rng.uniform(0.01, 1.0)
+        clips.append((tone + rng.standard_normal(length) * rng.uniform(0, 0.3)).astype(np.float32))
+    return clips
+
+def main():
+    '''
+    Returns the largest difference to librosa; exits non-zero past TOLERANCE
+    '''
+    parser = argparse.ArgumentParser(description='Check the NumPy MFCCs against librosa and time both')
+    parser.add_argument('files', nargs='*', help='audio files (default: synthetic clips)')
+    parser.add_argument('--clips', type=int, default=32, help='number of synthetic clips')
+    args = parser.parse_args()
+
+    if args.files:
+        from ml.media import load_audio
+        clips = [load_audio(path)[0] for path in args.files]
+    else:
+        clips = _test_clips(args.clips)
+
+    difference = check_against_librosa(clips)
+    print(f"Max abs difference to librosa: {difference:.2e} (tolerance {TOLERANCE:.0e})")
+
+    import librosa
+    started = time.perf_counter()
+    for clip in clips:
+        np.mean(librosa.feature.mfcc(y=clip, sr=AUDIO_SAMPLE_RATE, n_mfcc=N_MFCC).T, axis=0)
+    per_clip = time.perf_counter() - started
+
+    started = time.perf_counter()
+    mfcc_means(clips)
+    batched = time.perf_counter() - started
+
+    print(f"librosa, one clip at a time: {per_clip * 1000 / len(clips):.2f} ms/clip")
+    print(f"NumPy, batched:              {batched * 1000 / len(clips):.2f} ms/clip")
+    return difference
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,65 @@
+import io
+import logging
+
 import numpy as np
-import cv2
-from tensorflow import keras
-import pickle
-import librosa
-import os
+
+from ml.media import load_image, load_audio
+from ml.registry import get_model, registry
+from ml.cache import cache_key, create_cache, DEFAULT_MAX_ENTRIES, DEFAULT_TTL
+from ml.face import detect_faces, crop_faces
+from ml.audio_stream import analyze_stream, file_blocks, pcm_blocks
+from ml.mfcc import mfcc_mean
+from ml.batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from ml.metrics import span, count, record_fallback
+
+logger = logging.getLogger(__name__)
 
 # Emotion labels
 EMOTION_LABELS = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
 
+# Map label encoder classes to standard emotion labels
+TEXT_EMOTION_MAPPING = {
+    'happy': 'Happy',
+    'sad': 'Sad',
+    'anger': 'Angry',
+    'fear': 'Fear',
+    'surprise': 'Surprise',
+    'neutral': 'Neutral'
+}
+
+AUDIO_EMOTION_MAPPING = {
+    'happy': 'Happy',
+    'sad': 'Sad',
+    'angry': 'Angry',
+    'fear': 'Fear',
+    'surprise': 'Surprise',
+    'neutral': 'Neutral'
+}
+
+# Samples per model call in predict_batch()
+BATCH_SIZE = 64
+
+# Returned when a prediction fails; never stored in the prediction cache
+FALLBACK_PREDICTION = ('Neutral', 0.5)
+
+# The TF-IDF first stage answers a text when at least this confident;
+# the others go to the BiLSTM. Set by configure_text_cascade()
+DEFAULT_TEXT_CASCADE_THRESHOLD = 0.9
+_text_cascade_threshold = DEFAULT_TEXT_CASCADE_THRESHOLD
+
+# Per-modality micro-batchers, populated by configure_batching()
+_batchers = {}
+
+# Content-addressed prediction cache, set by configure_cache()
+_cache = None
+
 def predict_emotion(input_data, model_type):
     '''
     Unified prediction function for all modalities
 
     Args:
-        input_data: File path for face/audio, text string for text
+        input_data: File path or in-memory buffer (bytes / file-like)
+            for face/audio, text string for text
         model_type: 'face', 'text', or 'audio'
 
     Returns:
@@ -21,133 +67,387 @@ def predict_emotion(input_data, model_type):
     '''
 
     if model_type == 'face':
-        return predict_face_emotion(input_data)
+        predictor = predict_face_emotion
     elif model_type == 'text':
-        return predict_text_emotion(input_data)
+        predictor = predict_text_emotion
     elif model_type == 'audio':
-        return predict_audio_emotion(input_data)
+        predictor = predict_audio_emotion
     else:
         return 'Unknown', 0.0
 
-def predict_face_emotion(image_path):
+    if _cache is None:
+        return _counted(model_type, predictor(input_data))
+
+    try:
+        with span('cache_lookup', model_type):
+            key = cache_key(model_type, input_data, registry.version(model_type))
+            cached = _cache.get(key)
+    except Exception as e:
+        # Unreadable input or missing model; let the predictor report it
+        logger.warning('Error computing prediction cache key: %s', e)
+        return _counted(model_type, predictor(input_data))
+
+    if cached is not None:
+        count('predictions', modality=model_type, source='cache')
+        return tuple(cached)
+
+    result = _counted(model_type, predictor(input_data))
+    if result is not FALLBACK_PREDICTION:
+        _cache.set(key, result)
+    return result
+
+def _counted(model_type, result):
+    source = 'fallback' if result is FALLBACK_PREDICTION else 'model'
+    count('predictions', modality=model_type, source=source)
+    return result
+
+def configure_cache(backend='memory', max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, path=None):
     '''
-    Predict emotion from face image
+    Put a content-addressed prediction cache in front of predict_emotion
+
+    backend is 'memory' (in-process LRU), 'sqlite' (on-disk at path) or
+    'none' to disable caching.
     '''
-    try:
-        # Load model
-        model = keras.models.load_model('static/models/face_emotion_model.h5')
+    global _cache
+    _cache = create_cache(backend, max_entries=max_entries, ttl=ttl, path=path)
+
+def cache_stats():
+    '''
+    Hit/miss/eviction counters of the prediction cache
+    '''
+    return _cache.stats() if _cache is not None else None
+
+def configure_batching(enabled=True, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                       max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    '''
+    Route single predictions through per-modality micro-batchers
+
+    Concurrent predict_emotion calls for the same modality are merged into
+    one model.predict call of up to max_batch_size samples, waiting at most
+    max_wait_ms for the batch to fill.
+    '''
+    _batchers.clear()
+    if not enabled:
+        return
+
+    for modality in ('face', 'text', 'audio'):
+        _batchers[modality] = MicroBatcher(
+            lambda batch, modality=modality: run_model(modality, batch),
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name=modality
+        )
 
-        # Load and preprocess image
-        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+def configure_text_cascade(threshold=DEFAULT_TEXT_CASCADE_THRESHOLD):
+    '''
+    Answer confident texts from the linear first stage; None disables it
+    '''
+    global _text_cascade_threshold
+    _text_cascade_threshold = threshold
+
+def batching_stats():
+    '''
+    Batch size distribution and queue wait per modality
+    '''
+    return {modality: batcher.stats.snapshot() for modality, batcher in _batchers.items()}
+
+def run_model(model_type, batch):
+    '''
+    Run a preprocessed batch through the resident model of a modality
+    '''
+    model = get_model(model_type).model
+    with span('inference', model_type):
+        return model.predict(batch, verbose=0)
+
+def infer(model_type, sample):
+    '''
+    Class probabilities for one preprocessed sample
+    '''
+    batcher = _batchers.get(model_type)
+    if batcher is not None:
+        # Queue wait plus the shared model call
+        with span('batched_inference', model_type):
+            return batcher.predict(sample)
+    return run_model(model_type, sample[np.newaxis])[0]
 
-        # Detect face
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        faces = face_cascade.detectMultiScale(img, 1.3, 5)
+def decode_predictions(model_type, predictions):
+    '''
+    Turn a (n, classes) probability array into a list of (emotion, confidence)
+    '''
+    with span('decode_output', model_type):
+        predictions = np.asarray(predictions)
+        indices = np.argmax(predictions, axis=1)
+        confidences = predictions[np.arange(len(indices)), indices].astype(float)
 
-        if len(faces) == 0:
-            # If no face detected, use whole image
-            face = img
+        if model_type == 'face':
+            emotions = [EMOTION_LABELS[idx] for idx in indices]
         else:
-            x, y, w, h = faces[0]
-            face = img[y:y+h, x:x+w]
+            le = get_model(model_type).label_encoder
+            # Map to standard emotion labels if needed
+            mapping = TEXT_EMOTION_MAPPING if model_type == 'text' else AUDIO_EMOTION_MAPPING
+            emotions = [
+                mapping.get(emotion.lower(), emotion.capitalize())
+                for emotion in le.inverse_transform(indices)
+            ]
+
+    return [(str(emotion), float(confidence)) for emotion, confidence in zip(emotions, confidences)]
+
+def decode_prediction(model_type, probabilities):
+    '''
+    Turn a probability vector into (emotion, confidence)
+    '''
+    return decode_predictions(model_type, np.asarray(probabilities)[np.newaxis])[0]
+
+def preprocess_face(image):
+    '''
+    Detect the face in an image and return a normalized 48x48x1 crop
+    '''
+    with span('load_input', 'face'):
+        img = load_image(image)
+
+    # If no face is detected the whole image is used
+    with span('face_detect', 'face'):
+        boxes = detect_faces(img)
+    with span('crop', 'face'):
+        return crop_faces(img, boxes[:1])[0]
+
+def preprocess_texts(texts):
+    '''
+    Tokenize and pad a list of texts to the model's input length
+    '''
+    tokenizer = get_model('text').tokenizer
+    with span('tokenize', 'text'):
+        return tokenizer.encode_batch(list(texts))
 
-        # Resize and normalize
-        face = cv2.resize(face, (48, 48))
-        face = face / 255.0
-        face = face.reshape(1, 48, 48, 1)
+def preprocess_text(text):
+    '''
+    Tokenize and pad text to the model's input length
+    '''
+    return preprocess_texts([text])[0]
+
+def first_stage_texts(texts):
+    '''
+    (emotion, confidence) per text from the TF-IDF + logistic regression
+    stage, or None for the texts it is not confident enough about
+
+    Every text is None when the cascade is disabled or no linear model has
+    been trained (see ml/train_text.py).
+    '''
+    texts = list(texts)
+    linear = getattr(get_model('text'), 'linear', None) if _text_cascade_threshold is not None else None
+    if linear is None:
+        return [None] * len(texts)
+
+    try:
+        with span('linear_inference', 'text'):
+            probabilities = linear.predict_proba(texts)
+    except Exception as e:
+        logger.warning('Error in linear text prediction: %s', e)
+        return [None] * len(texts)
+
+    indices = np.argmax(probabilities, axis=1)
+    confidences = probabilities[np.arange(len(indices)), indices]
+    results = [
+        (TEXT_EMOTION_MAPPING.get(str(label).lower(), str(label).capitalize()), float(confidence))
+        if confidence >= _text_cascade_threshold else None
+        for label, confidence in zip(linear.classes_[indices], confidences)
+    ]
+
+    answered = len(results) - results.count(None)
+    count('text_cascade', answered, stage='linear')
+    count('text_cascade', len(results) - answered, stage='bilstm')
+    return results
+
+def preprocess_audio(audio):
+    '''
+    Mean MFCC vector of the first 3 seconds of an audio file or buffer
+    '''
+    with span('load_input', 'audio'):
+        audio, sr = load_audio(audio)
+
+    with span('mfcc', 'audio'):
+        return mfcc_mean(audio, sr)
+
+def predict_batch(inputs, model_type, batch_size=BATCH_SIZE):
+    '''
+    Predict emotions for many inputs with one model call per batch_size chunk
+
+    Yields (emotion, confidence, error) per input, in order, as each chunk is
+    scored. Inputs that cannot be preprocessed yield the fallback prediction
+    and an error message instead of failing the whole batch.
+    '''
+    preprocess = {'face': preprocess_face, 'audio': preprocess_audio}.get(model_type)
+
+    for start in range(0, len(inputs), batch_size):
+        chunk = inputs[start:start + batch_size]
+        errors = [None] * len(chunk)
+        scored = {}
+
+        try:
+            if model_type == 'text':
+                # Texts the linear stage is sure about skip the BiLSTM
+                for i, result in enumerate(first_stage_texts(chunk)):
+                    if result is not None:
+                        scored[i] = result
+                valid = [i for i in range(len(chunk)) if i not in scored]
+                samples = preprocess_texts([chunk[i] for i in valid]) if valid else None
+            else:
+                samples, valid = [], []
+                for i, item in enumerate(chunk):
+                    try:
+                        samples.append(preprocess(item))
+                        valid.append(i)
+                    except Exception as e:
+                        record_fallback(model_type, e)
+                        errors[i] = str(e)
+                samples = np.stack(samples) if samples else None
+
+            if valid:
+                results = decode_predictions(model_type, run_model(model_type, samples))
+                scored.update(zip(valid, results))
+        except Exception as e:
+            logger.error('Error in %s batch prediction: %s', model_type, e)
+            failed = [i for i, error in enumerate(errors) if error is None and i not in scored]
+            record_fallback(model_type, e, amount=len(failed))
+            errors = [error or str(e) for error in errors]
+
+        for i in range(len(chunk)):
+            if i in scored:
+                yield scored[i] + (None,)
+            else:
+                yield FALLBACK_PREDICTION + (errors[i],)
+
+def predict_face_emotion(image):
+    '''
+    Predict emotion from face image
+    '''
+    try:
+        face = preprocess_face(image)
+        return decode_prediction('face', infer('face', face))
 
-        # Predict
-        predictions = model.predict(face, verbose=0)
-        emotion_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][emotion_idx])
+    except Exception as e:
+        logger.error('Error in face prediction: %s', e)
+        record_fallback('face', e)
+        return FALLBACK_PREDICTION
 
-        emotion = EMOTION_LABELS[emotion_idx]
+def predict_faces(image):
+    '''
+    Predict emotion for every face in an image in one batched call
+
+    Returns a dict with per-face results (box, emotion, confidence) and the
+    aggregate emotion/confidence over the mean of the face probabilities.
+    '''
+    try:
+        with span('load_input', 'face'):
+            img = load_image(image)
+        with span('face_detect', 'face'):
+            boxes = detect_faces(img)
+        with span('crop', 'face'):
+            crops = crop_faces(img, boxes)
+        predictions = run_model('face', crops)
 
-        return emotion, confidence
+        faces = []
+        for i, probabilities in enumerate(predictions):
+            emotion, confidence = decode_prediction('face', probabilities)
+            faces.append({
+                'box': [int(v) for v in boxes[i]] if len(boxes) else None,
+                'emotion': emotion,
+                'confidence': confidence
+            })
+
+        emotion, confidence = decode_prediction('face', np.mean(predictions, axis=0))
+        return {'emotion': emotion, 'confidence': confidence, 'faces': faces}
 
     except Exception as e:
-        print(f"Error in face prediction: {e}")
-        return 'Neutral', 0.5
+        logger.error('Error in face prediction: %s', e)
+        record_fallback('face', e)
+        emotion, confidence = FALLBACK_PREDICTION
+        return {'emotion': emotion, 'confidence': confidence, 'faces': []}
 
 def predict_text_emotion(text):
     '''
     Predict emotion from text
+
+    Goes to the BiLSTM only when the linear first stage is not confident.
     '''
     try:
-        # Load model and preprocessors
-        model = keras.models.load_model('static/models/text_emotion_model.h5')
-
-        with open('static/models/text_tokenizer.pkl', 'rb') as f:
-            tokenizer = pickle.load(f)
-        with open('static/models/text_label_encoder.pkl', 'rb') as f:
-            le = pickle.load(f)
-
-        # Preprocess text
-        from keras.preprocessing.sequence import pad_sequences
-        sequence = tokenizer.texts_to_sequences([text])
-        padded = pad_sequences(sequence, maxlen=100, padding='post', truncating='post')
-
-        # Predict
-        predictions = model.predict(padded, verbose=0)
-        emotion_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][emotion_idx])
-
-        emotion = le.inverse_transform([emotion_idx])[0]
-
-        # Map to standard emotion labels if needed
-        emotion_mapping = {
-            'happy': 'Happy',
-            'sad': 'Sad',
-            'anger': 'Angry',
-            'fear': 'Fear',
-            'surprise': 'Surprise',
-            'neutral': 'Neutral'
-        }
-        emotion = emotion_mapping.get(emotion.lower(), emotion.capitalize())
-
-        return emotion, confidence
+        result = first_stage_texts([text])[0]
+        if result is not None:
+            return result
+
+        padded = preprocess_text(text)
+        return decode_prediction('text', infer('text', padded))
 
     except Exception as e:
-        print(f"Error in text prediction: {e}")
-        return 'Neutral', 0.5
+        logger.error('Error in text prediction: %s', e)
+        record_fallback('text', e)
+        return FALLBACK_PREDICTION
 
-def predict_audio_emotion(audio_path):
+def predict_audio_emotion(audio):
     '''
     Predict emotion from audio file
     '''
     try:
-        # Load model and label encoder
-        model = keras.models.load_model('static/models/audio_emotion_model.h5')
-
-        with open('static/models/audio_label_encoder.pkl', 'rb') as f:
-            le = pickle.load(f)
-
-        # Extract features
-        audio, sr = librosa.load(audio_path, duration=3, sr=22050)
-        mfcc = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=40)
-        mfcc_processed = np.mean(mfcc.T, axis=0)
-        mfcc_processed = mfcc_processed.reshape(1, -1)
-
-        # Predict
-        predictions = model.predict(mfcc_processed, verbose=0)
-        emotion_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][emotion_idx])
-
-        emotion = le.inverse_transform([emotion_idx])[0]
-
-        # Map to standard emotion labels if needed
-        emotion_mapping = {
-            'happy': 'Happy',
-            'sad': 'Sad',
-            'angry': 'Angry',
-            'fear': 'Fear',
-            'surprise': 'Surprise',
-            'neutral': 'Neutral'
-        }
-        emotion = emotion_mapping.get(emotion.lower(), emotion.capitalize())
-
-        return emotion, confidence
+        mfcc_processed = preprocess_audio(audio)
+        return decode_prediction('audio', infer('audio', mfcc_processed))
+
+    except Exception as e:
+        logger.error('Error in audio prediction: %s', e)
+        record_fallback('audio', e)
+        return FALLBACK_PREDICTION
+
+def _audio_timeline(blocks, sample_rate):
+    # The whole recording; its window model calls also count towards 'inference'
+    with span('stream_analysis', 'audio'):
+        probabilities, spans = analyze_stream(
+            blocks, sample_rate, lambda windows: run_model('audio', windows)
+        )
+    if not spans:
+        raise ValueError('No audio samples received')
+
+    timeline = []
+    for (start, end), (emotion, confidence) in zip(spans, decode_predictions('audio', probabilities)):
+        timeline.append({
+            'start': round(start, 3),
+            'end': round(end, 3),
+            'emotion': emotion,
+            'confidence': confidence
+        })
+
+    emotion, confidence = decode_prediction('audio', probabilities.mean(axis=0))
+    return {'emotion': emotion, 'confidence': confidence, 'timeline': timeline}
+
+def predict_audio_timeline(audio):
+    '''
+    Emotion timeline over overlapping windows of a whole recording
+
+    The file (path, bytes or file-like) is read block by block, so memory
+    stays flat regardless of its length. Returns the aggregate
+    emotion/confidence over the mean window probabilities and a per-window
+    timeline.
+    '''
+    try:
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = io.BytesIO(audio)
+        blocks = file_blocks(audio)
+        sample_rate = next(blocks)
+        return _audio_timeline(blocks, sample_rate)
+
+    except Exception as e:
+        logger.error('Error in audio prediction: %s', e)
+        record_fallback('audio', e)
+        emotion, confidence = FALLBACK_PREDICTION
+        return {'emotion': emotion, 'confidence': confidence, 'timeline': []}
+
+def predict_audio_stream(chunks, sample_rate, pcm_format='f32le', channels=1):
+    '''
+    Emotion timeline over raw PCM byte chunks, analyzed as they arrive
+    '''
+    try:
+        return _audio_timeline(pcm_blocks(chunks, pcm_format, channels), sample_rate)
 
     except Exception as e:
-        print(f"Error in audio prediction: {e}")
-        return 'Neutral', 0.5
+        logger.error('Error in audio prediction: %s', e)
+        record_fallback('audio', e)
+        emotion, confidence = FALLBACK_PREDICTION
+        return {'emotion': emotion, 'confidence': confidence, 'timeline': []}
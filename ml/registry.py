@@ -0,0 +1,224 @@
+import logging
+import os
+import pickle
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = 'static/models'
+
+# Artifacts needed by each modality, relative to MODEL_DIR
+MODEL_FILES = {
+    'face': {
+        'model': 'face_emotion_model.h5',
+    },
+    'text': {
+        'model': 'text_emotion_model.h5',
+        'tokenizer': 'text_vocab.npz',
+        'label_encoder': 'text_label_encoder.pkl',
+    },
+    'audio': {
+        'model': 'audio_emotion_model.h5',
+        'label_encoder': 'audio_label_encoder.pkl',
+    },
+}
+
+# Artifacts a modality can do without, loaded when present
+OPTIONAL_FILES = {
+    'text': {
+        # TF-IDF + logistic regression first stage of the text cascade
+        'linear': 'text_linear_model.pkl',
+    },
+}
+
+# Older artifacts used when the current one is missing, converted on load
+LEGACY_FILES = {
+    'text': {
+        # Pickled Keras tokenizer of models trained before text_vocab.npz existed
+        'tokenizer': 'text_tokenizer.pkl',
+    },
+}
+
+# Inference backends: full Keras models or TFLite exports (ml/export_lite.py)
+BACKENDS = ('keras', 'lite')
+
+# How often (seconds) to stat the artifacts on disk to detect a retrained model
+RELOAD_CHECK_INTERVAL = 2.0
+
+def convert_legacy(name, artifact):
+    '''
+    Turn a legacy artifact into what serving expects
+    '''
+    if name == 'tokenizer':
+        from ml.text_vocab import VocabTokenizer
+        return VocabTokenizer.from_keras(artifact)
+    return artifact
+
+def load_artifact(path):
+    '''
+    Load a single artifact from disk based on its extension
+    '''
+    if path.endswith('.h5') or path.endswith('.keras'):
+        from tensorflow import keras
+        return keras.models.load_model(path)
+    if path.endswith('.tflite'):
+        from ml.lite import LiteModel
+        return LiteModel(path)
+    if path.endswith('.npz'):
+        from ml.text_vocab import VocabTokenizer
+        return VocabTokenizer.load(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+class ModelBundle:
+    '''
+    The resident artifacts of one modality (model, tokenizer, label encoder...)
+    '''
+
+    def __init__(self, modality, artifacts, mtimes):
+        self.modality = modality
+        self.artifacts = artifacts
+        self.mtimes = mtimes
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['artifacts'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    @property
+    def version(self):
+        '''
+        Identifier that changes whenever one of the artifacts changes on disk
+        '''
+        return '-'.join(f'{int(mtime * 1000):x}' for _, mtime in sorted(self.mtimes.items()))
+
+class ModelRegistry:
+    '''
+    Process-wide cache of loaded models
+
+    Each modality is loaded on first use, kept resident afterwards and
+    reloaded when any of its files changes on disk, or an optional file
+    appears or disappears.
+    '''
+
+    def __init__(self, model_dir=MODEL_DIR, model_files=None, optional_files=None,
+                 check_interval=RELOAD_CHECK_INTERVAL, loader=load_artifact, legacy_files=None):
+        self.model_dir = model_dir
+        self.model_files = model_files if model_files is not None else MODEL_FILES
+        self.optional_files = optional_files if optional_files is not None else OPTIONAL_FILES
+        self.legacy_files = legacy_files if legacy_files is not None else LEGACY_FILES
+        self.check_interval = check_interval
+        self.loader = loader
+        self.backends = {modality: 'keras' for modality in self.model_files}
+        self._bundles = {}
+        self._locks = {modality: threading.Lock() for modality in self.model_files}
+
+    def set_backend(self, modality, backend):
+        '''
+        Serve a modality from its Keras model or its TFLite export
+        '''
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown inference backend: {backend}')
+        if self.backends[modality] != backend:
+            with self._locks[modality]:
+                self.backends[modality] = backend
+                self._bundles.pop(modality, None)
+
+    def paths(self, modality):
+        paths = {
+            name: os.path.join(self.model_dir, filename)
+            for name, filename in self.model_files[modality].items()
+        }
+        if self.backends[modality] == 'lite':
+            paths['model'] = os.path.splitext(paths['model'])[0] + '.tflite'
+        for name, filename in self.legacy_files.get(modality, {}).items():
+            legacy = os.path.join(self.model_dir, filename)
+            if not os.path.exists(paths[name]) and os.path.exists(legacy):
+                paths[name] = legacy
+        for name, filename in self.optional_files.get(modality, {}).items():
+            path = os.path.join(self.model_dir, filename)
+            if os.path.exists(path):
+                paths[name] = path
+        return paths
+
+    def _mtimes(self, modality):
+        return {name: os.path.getmtime(path) for name, path in self.paths(modality).items()}
+
+    def _is_stale(self, bundle):
+        now = time.time()
+        if now - bundle.checked_at < self.check_interval:
+            return False
+        bundle.checked_at = now
+        try:
+            return self._mtimes(bundle.modality) != bundle.mtimes
+        except OSError:
+            # Artifact is being replaced; keep serving the resident copy
+            return False
+
+    def get(self, modality):
+        '''
+        Return the ModelBundle for a modality, loading it if needed
+        '''
+        if modality not in self.model_files:
+            raise KeyError(f'Unknown modality: {modality}')
+
+        bundle = self._bundles.get(modality)
+        if bundle is not None and not self._is_stale(bundle):
+            return bundle
+
+        with self._locks[modality]:
+            # Another thread may have (re)loaded it while we waited
+            current = self._bundles.get(modality)
+            if current is not None and current is not bundle:
+                return current
+            try:
+                self._bundles[modality] = self._load(modality)
+            except Exception:
+                if current is None:
+                    raise
+                # Half-written retrain output; keep serving the old model
+                logger.exception('Error reloading %s model, keeping previous', modality)
+                return current
+            return self._bundles[modality]
+
+    def _load(self, modality):
+        mtimes = self._mtimes(modality)
+        legacy = self.legacy_files.get(modality, {})
+        artifacts = {}
+        for name, path in self.paths(modality).items():
+            artifacts[name] = self.loader(path)
+            if name in legacy and os.path.basename(path) == legacy[name]:
+                logger.warning('%s is missing; converting %s on every load, run ml.text_vocab to export it',
+                               self.model_files[modality][name], path)
+                artifacts[name] = convert_legacy(name, artifacts[name])
+        logger.info('Loaded %s model artifacts (%s backend)', modality, self.backends[modality])
+        return ModelBundle(modality, artifacts, mtimes)
+
+    def version(self, modality):
+        return self.get(modality).version
+
+    def is_loaded(self, modality):
+        return modality in self._bundles
+
+    def unload(self, modality=None):
+        if modality is None:
+            self._bundles.clear()
+        else:
+            self._bundles.pop(modality, None)
+
+# Shared registry used by ml.predict
+registry = ModelRegistry()
+
+def get_model(modality):
+    return registry.get(modality)
+
+def configure_backends(backends):
+    '''
+    Set the inference backend per modality, e.g. {'face': 'lite'}
+    '''
+    for modality, backend in backends.items():
+        registry.set_backend(modality, backend)
@@ -0,0 +1,413 @@
+import argparse
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+MODALITIES = ('face', 'text', 'audio')
+
+# Searched when no space is given; each contains the production configuration
+DEFAULT_SPACES = {
+    'face': {
+        'width': [16, 32],
+        'dense_units': [256, 1024],
+        'learning_rate': [0.0001, 0.0003],
+        'batch_size': [64],
+    },
+    'text': {
+        'embedding_dim': [64, 128],
+        'lstm_units': [[64], [128, 64]],
+        'dropout': [0.3],
+        'batch_size': [32],
+    },
+    'audio': {
+        'hidden_units': [[128, 64], [256, 128, 64]],
+        'dropout': [0.2, 0.3],
+        'learning_rate': [0.001, 0.0003],
+        'batch_size': [32],
+    },
+}
+
+DEFAULT_BATCH_SIZES = {'face': 64, 'text': 32, 'audio': 32}
+
+# Trial parameters read by the training loop; the rest go to create_<modality>_model
+TRAINING_PARAMS = ('batch_size',)
+
+DEFAULT_EPOCHS = 20
+# Epochs without a better val_accuracy before a trial stops
+DEFAULT_PATIENCE = 3
+# A trial is pruned when its best val_accuracy is below the median of the
+# finished trials at the same epoch, once PRUNE_MIN_TRIALS have finished
+PRUNE_MIN_TRIALS = 3
+PRUNE_GRACE_EPOCHS = 2
+
+# Single-sample predictions timed per trained model
+LATENCY_RUNS = 50
+
+SWEEP_DIR = 'sweeps'
+
+# Trial outcomes
+COMPLETE = 'complete'
+EARLY_STOPPED = 'early_stopped'
+PRUNED = 'pruned'
+FAILED = 'failed'
+
+def grid(space):
+    '''
+    Every combination of a space whose values are lists
+    '''
+    for name, values in space.items():
+        if not isinstance(values, list):
+            raise ValueError(f'Grid search needs a list of values for {name}')
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def sample(space, trials, seed=0):
+    '''
+    `trials` random configurations of a space
+
+    Values are lists to choose from, or {"uniform": [low, high]} and
+    {"log_uniform": [low, high]} ranges. Spaces made only of lists are
+    sampled without repeating a configuration.
+    '''
+    rng = random.Random(seed)
+    if all(isinstance(values, list) for values in space.values()):
+        configs = grid(space)
+        return rng.sample(configs, min(trials, len(configs)))
+
+    configs = []
+    for _ in range(trials):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, list):
+                config[name] = rng.choice(values)
+            elif 'uniform' in values:
+                low, high = values['uniform']
+                config[name] = rng.uniform(low, high)
+            elif 'log_uniform' in values:
+                low, high = values['log_uniform']
+                config[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                raise ValueError(f'Unknown search range for {name}: {values}')
+        configs.append(config)
+    return configs
+
+def prepare_data(modality, datasets_dir='datasets'):
+    '''
+    Training/validation arrays of a modality, split as in its training script
+    '''
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    if modality == 'face':
+        from ml.train_face import load_fer2013_arrays
+        pixels, labels = load_fer2013_arrays(os.path.join(datasets_dir, 'fer2013.csv'))
+        train_idx, val_idx = train_test_split(np.arange(len(labels)), test_size=0.2, random_state=42)
+        return {'pixels': pixels, 'labels': labels, 'train_idx': train_idx, 'val_idx': val_idx}
+
+    if modality == 'text':
+        from tensorflow.keras.preprocessing.text import Tokenizer
+        from tensorflow.keras.preprocessing.sequence import pad_sequences
+        from ml.train_text import load_text_data
+        texts, emotions = load_text_data(os.path.join(datasets_dir, 'text.csv'))
+        tokenizer = Tokenizer(num_words=10000, oov_token='<OOV>')
+        tokenizer.fit_on_texts(texts)
+        X = pad_sequences(tokenizer.texts_to_sequences(texts), maxlen=100, padding='post', truncating='post')
+    elif modality == 'audio':
+        from ml.train_audio import load_audio_data
+        X, emotions = load_audio_data(os.path.join(datasets_dir, 'emotion.csv'))
+    else:
+        raise ValueError(f'Unknown modality: {modality}')
+
+    le = LabelEncoder()
+    y = le.fit_transform(emotions)
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
+    return {
+        'X_train': X_train, 'X_val': X_val, 'y_train': y_train, 'y_val': y_val,
+        'num_classes': np.array(len(le.classes_))
+    }
+
+def save_data(data, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, array in data.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.asarray(array))
+
+def load_data(directory):
+    '''
+    Memory-map the arrays written by save_data; trials share them through the page cache
+    '''
+    return {
+        os.path.splitext(filename)[0]: np.load(os.path.join(directory, filename), mmap_mode='r')
+        for filename in os.listdir(directory) if filename.endswith('.npy')
+    }
+
+class MedianStopping:
+    '''
+    Prune a trial whose best val_accuracy so far is below the median of the
+    finished trials at the same epoch
+
+    Finished trials publish their learning curve as a JSON file in
+    curves_dir, so trials running in other processes can compare against it.
+    '''
+
+    def __init__(self, curves_dir, min_trials=PRUNE_MIN_TRIALS, grace_epochs=PRUNE_GRACE_EPOCHS):
+        self.curves_dir = curves_dir
+        self.min_trials = min_trials
+        self.grace_epochs = grace_epochs
+        self.best = -math.inf
+        self.pruned = False
+
+    def _finished_curves(self):
+        curves = []
+        for filename in os.listdir(self.curves_dir):
+            if filename.endswith('.json'):
+                with open(os.path.join(self.curves_dir, filename)) as f:
+                    curves.append(json.load(f))
+        return [curve for curve in curves if curve]
+
+    def should_stop(self, epoch, value):
+        self.best = max(self.best, value)
+        if epoch + 1 < self.grace_epochs:
+            return False
+
+        bests = [max(curve[:epoch + 1]) for curve in self._finished_curves()]
+        if len(bests) >= self.min_trials and self.best < float(np.median(bests)):
+            self.pruned = True
+        return self.pruned
+
+def publish_curve(curves_dir, trial_id, curve):
+    path = os.path.join(curves_dir, f'{trial_id}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(curve, f)
+    os.replace(path + '.tmp', path)
+
+# Per worker process, set by _init_worker
+_data = None
+_threads = 1
+
+def _init_worker(data_dir, threads):
+    # Runs before TensorFlow is imported in the (spawned) worker process
+    global _data, _threads
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(threads)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+    _data = load_data(data_dir)
+    _threads = threads
+
+def _build_trial(modality, data, model_params, batch_size):
+    '''
+    (model, fit arguments, one validation sample for latency) of a trial
+    '''
+    if modality == 'face':
+        import tensorflow as tf
+        from ml.train_face import create_face_model, make_face_dataset
+
+        options = tf.data.Options()
+        options.threading.private_threadpool_size = _threads
+        train = make_face_dataset(data['pixels'], data['labels'], data['train_idx'], batch_size,
+                                  shuffle=True, augment=True).with_options(options)
+        val = make_face_dataset(data['pixels'], data['labels'], data['val_idx'], batch_size).with_options(options)
+        sample = (data['pixels'][data['val_idx'][:1]].astype(np.float32) / 255.0)[..., np.newaxis]
+        return create_face_model(**model_params), {'x': train, 'validation_data': val}, sample
+
+    X_train, y_train = np.asarray(data['X_train']), np.asarray(data['y_train'])
+    X_val, y_val = np.asarray(data['X_val']), np.asarray(data['y_val'])
+    num_classes = int(data['num_classes'])
+
+    if modality == 'text':
+        from ml.train_text import create_text_model
+        model = create_text_model(max_length=X_train.shape[1], num_classes=num_classes, **model_params)
+    else:
+        from ml.train_audio import create_audio_model
+        model = create_audio_model(input_shape=(X_train.shape[1],), num_classes=num_classes, **model_params)
+
+    fit_args = {'x': X_train, 'y': y_train, 'batch_size': batch_size, 'validation_data': (X_val, y_val)}
+    return model, fit_args, X_val[:1]
+
+def measure_latency(model, sample, runs=LATENCY_RUNS):
+    '''
+    Median single-sample model.predict time in ms, as served without batching
+    '''
+    model.predict(sample, verbose=0)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model.predict(sample, verbose=0)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return float(np.median(timings))
+
+def run_trial(trial_id, modality, params, epochs, patience, sweep_dir):
+    '''
+    Train one configuration in a worker process and measure the result
+    '''
+    from tensorflow import keras
+
+    result = {'trial': trial_id, 'params': params}
+    curves_dir = os.path.join(sweep_dir, 'curves')
+    model_params = {name: value for name, value in params.items() if name not in TRAINING_PARAMS}
+    batch_size = params.get('batch_size', DEFAULT_BATCH_SIZES[modality])
+    started = time.perf_counter()
+
+    try:
+        model, fit_args, sample = _build_trial(modality, _data, model_params, batch_size)
+        pruner = MedianStopping(curves_dir)
+
+        def on_epoch_end(epoch, logs):
+            if pruner.should_stop(epoch, logs['val_accuracy']):
+                model.stop_training = True
+
+        early_stopping = keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=patience)
+        history = model.fit(
+            epochs=epochs, verbose=0,
+            callbacks=[early_stopping, keras.callbacks.LambdaCallback(on_epoch_end=on_epoch_end)],
+            **fit_args
+        )
+    except Exception as e:
+        print(f"Error in trial {trial_id}: {e}")
+        result.update(status=FAILED, error=str(e), train_seconds=round(time.perf_counter() - started, 1))
+        return result
+
+    curve = [float(value) for value in history.history['val_accuracy']]
+    publish_curve(curves_dir, trial_id, curve)
+
+    if pruner.pruned:
+        status = PRUNED
+    elif len(curve) < epochs:
+        status = EARLY_STOPPED
+    else:
+        status = COMPLETE
+
+    result.update(
+        status=status,
+        val_accuracy=round(max(curve), 4),
+        epochs=len(curve),
+        param_count=int(model.count_params()),
+        latency_ms=round(measure_latency(model, sample), 3),
+        train_seconds=round(time.perf_counter() - started, 1)
+    )
+    return result
+
+RESULT_COLUMNS = ('trial', 'status', 'val_accuracy', 'epochs', 'param_count', 'latency_ms', 'train_seconds')
+
+def write_results(results, path):
+    '''
+    One CSV row per trial, best val_accuracy first; list parameters are JSON-encoded
+    '''
+    names = sorted({name for result in results for name in result['params']})
+    rows = sorted(results, key=lambda result: result.get('val_accuracy', -1), reverse=True)
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_COLUMNS + tuple(names))
+        for result in rows:
+            params = [result['params'].get(name, '') for name in names]
+            writer.writerow(
+                [result.get(column, '') for column in RESULT_COLUMNS]
+                + [json.dumps(value) if isinstance(value, list) else value for value in params]
+            )
+
+def print_results(results):
+    print(f"\n{'trial':>5}  {'status':<13}{'val acc':>8}{'epochs':>7}{'params':>11}{'p50 ms':>8}{'train s':>9}  config")
+    for result in sorted(results, key=lambda result: result.get('val_accuracy', -1), reverse=True):
+        if result['status'] == FAILED:
+            print(f"{result['trial']:>5}  {FAILED:<13}{'-':>8}{'-':>7}{'-':>11}{'-':>8}"
+                  f"{result['train_seconds']:>9.1f}  {json.dumps(result['params'])}")
+            continue
+        print(f"{result['trial']:>5}  {result['status']:<13}{result['val_accuracy']:>8.4f}{result['epochs']:>7}"
+              f"{result['param_count']:>11,}{result['latency_ms']:>8.2f}{result['train_seconds']:>9.1f}  "
+              f"{json.dumps(result['params'])}")
+
+def run_sweep(modality, configs, epochs=DEFAULT_EPOCHS, patience=DEFAULT_PATIENCE, workers=None,
+              threads=1, datasets_dir='datasets', sweep_dir=None):
+    '''
+    Train each configuration in parallel worker processes
+
+    The dataset is loaded once and shared with the workers as memory-mapped
+    arrays. Each worker is limited to `threads` CPU threads; by default
+    there are as many workers as fit in the machine's cores. Results are
+    written to results.csv in sweep_dir as trials finish.
+    '''
+    if modality not in MODALITIES:
+        raise ValueError(f'Unknown modality: {modality}')
+
+    sweep_dir = sweep_dir or os.path.join(SWEEP_DIR, f"{modality}-{time.strftime('%Y%m%d-%H%M%S')}")
+    data_dir = os.path.join(sweep_dir, 'data')
+    os.makedirs(os.path.join(sweep_dir, 'curves'), exist_ok=True)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+
+    print(f"Preparing {modality} dataset...")
+    save_data(prepare_data(modality, datasets_dir), data_dir)
+    with open(os.path.join(sweep_dir, 'configs.json'), 'w') as f:
+        json.dump(configs, f, indent=2)
+
+    print(f"Running {len(configs)} trials on {workers} workers x {threads} threads...")
+    results_path = os.path.join(sweep_dir, 'results.csv')
+    results = []
+    # Spawned workers start without TensorFlow, so the thread limits apply
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(data_dir, threads)) as executor:
+            futures = [
+                executor.submit(run_trial, trial_id, modality, params, epochs, patience, sweep_dir)
+                for trial_id, params in enumerate(configs)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                accuracy = f"{result['val_accuracy']:.4f}" if 'val_accuracy' in result else '-'
+                print(f"Trial {result['trial']} {result['status']} "
+                      f"(val_accuracy {accuracy}) [{len(results)}/{len(configs)}]")
+                write_results(results, results_path)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_results(results)
+    print(f"Results written to {results_path}")
+    return results
+
+def load_space(value):
+    '''
+    A search space from inline JSON or a .json file
+    '''
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+def main():
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep of a training script')
+    parser.add_argument('modality', choices=MODALITIES)
+    parser.add_argument('--space', help='JSON search space, inline or a file (default: DEFAULT_SPACES)')
+    parser.add_argument('--trials', type=int, help='random search with this many trials (default: full grid)')
+    parser.add_argument('--seed', type=int, default=0, help='random search seed')
+    parser.add_argument('--epochs', type=int, default=DEFAULT_EPOCHS)
+    parser.add_argument('--patience', type=int, default=DEFAULT_PATIENCE,
+                        help='epochs without improvement before a trial stops')
+    parser.add_argument('--workers', type=int, help='parallel trials (default: cores // threads)')
+    parser.add_argument('--threads', type=int, default=1, help='CPU threads per trial')
+    parser.add_argument('--datasets-dir', default='datasets')
+    parser.add_argument('--output', help=f'sweep directory (default: {SWEEP_DIR}/<modality>-<time>)')
+    args = parser.parse_args()
+
+    space = load_space(args.space) if args.space else DEFAULT_SPACES[args.modality]
+    configs = sample(space, args.trials, args.seed) if args.trials else grid(space)
+    run_sweep(args.modality, configs, epochs=args.epochs, patience=args.patience, workers=args.workers,
+              threads=args.threads, datasets_dir=args.datasets_dir, sweep_dir=args.output)
+
+if __name__ == '__main__':
+    main()
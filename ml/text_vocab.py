@@ -0,0 +1,99 @@
+import json
+import sys
+
+import numpy as np
+
+# Defaults of the Keras Tokenizer used in train_text.py
+DEFAULT_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+MAX_LENGTH = 100
+
+class VocabTokenizer:
+    '''
+    Inference-side replacement for the pickled Keras Tokenizer
+
+    Holds only the words the model can see (index < num_words) and
+    reproduces texts_to_sequences + pad_sequences(padding='post',
+    truncating='post') exactly, without importing Keras.
+    '''
+
+    def __init__(self, words, oov_index=None, lower=True, filters=DEFAULT_FILTERS,
+                 split=' ', maxlen=MAX_LENGTH):
+        # words[i] is the word with index i + 1
+        self.words = list(words)
+        self.word_index = {word: i + 1 for i, word in enumerate(self.words)}
+        self.oov_index = oov_index
+        self.lower = lower
+        self.filters = filters
+        self.split = split
+        self.maxlen = maxlen
+        self._table = str.maketrans({c: split for c in filters})
+
+    @classmethod
+    def from_keras(cls, tokenizer, maxlen=MAX_LENGTH):
+        '''
+        Build from a fitted keras Tokenizer, keeping the top num_words - 1 words
+        '''
+        limit = tokenizer.num_words or (len(tokenizer.word_index) + 1)
+        words = [tokenizer.index_word[i] for i in range(1, min(limit, len(tokenizer.word_index) + 1))]
+        oov_index = tokenizer.word_index.get(tokenizer.oov_token) if tokenizer.oov_token else None
+        return cls(words, oov_index=oov_index, lower=tokenizer.lower, filters=tokenizer.filters,
+                   split=tokenizer.split, maxlen=maxlen)
+
+    def save(self, path):
+        '''
+        Write the vocabulary as a compact .npz (newline-joined UTF-8 words plus settings)
+        '''
+        blob = np.frombuffer('\n'.join(self.words).encode('utf-8'), dtype=np.uint8)
+        config = {
+            'oov_index': self.oov_index,
+            'lower': self.lower,
+            'filters': self.filters,
+            'split': self.split,
+            'maxlen': self.maxlen,
+        }
+        with open(path, 'wb') as f:
+            np.savez(f, words=blob, config=np.frombuffer(json.dumps(config).encode('utf-8'), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            blob = data['words'].tobytes().decode('utf-8')
+            config = json.loads(data['config'].tobytes().decode('utf-8'))
+        return cls(blob.split('\n') if blob else [], **config)
+
+    def _ids(self, text):
+        if self.lower:
+            text = text.lower()
+        tokens = [token for token in text.translate(self._table).split(self.split) if token]
+
+        get = self.word_index.get
+        if self.oov_index is not None:
+            return [get(token, self.oov_index) for token in tokens]
+        return [i for i in map(get, tokens) if i is not None]
+
+    def texts_to_sequences(self, texts):
+        return [self._ids(text) for text in texts]
+
+    def encode_batch(self, texts):
+        '''
+        Padded (n, maxlen) int32 sequences for a list of texts
+        '''
+        out = np.zeros((len(texts), self.maxlen), dtype=np.int32)
+        for row, text in enumerate(texts):
+            ids = self._ids(text)[:self.maxlen]
+            out[row, :len(ids)] = ids
+        return out
+
+def export_vocabulary(tokenizer, path, maxlen=MAX_LENGTH):
+    '''
+    Save the inference vocabulary of a fitted keras Tokenizer
+    '''
+    VocabTokenizer.from_keras(tokenizer, maxlen=maxlen).save(path)
+
+if __name__ == '__main__':
+    # Convert an existing pickled tokenizer:
+    # python -m ml.text_vocab static/models/text_tokenizer.pkl static/models/text_vocab.npz
+    import pickle
+    with open(sys.argv[1], 'rb') as f:
+        export_vocabulary(pickle.load(f), sys.argv[2])
+    print(f"Vocabulary saved to {sys.argv[2]}")
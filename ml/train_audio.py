@@ -1,4 +1,6 @@
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import pandas as pd
 from tensorflow import keras
 from tensorflow.keras.models import Sequential
@@ -6,66 +8,139 @@ from tensorflow.keras.layers import Dense, Dropout, LSTM, Conv1D, MaxPooling1D,
 from sklearn.model_selection import train_test_split
 import librosa
 
-def extract_audio_features(file_path):
+from ml.feature_store import FeatureStore
+from ml.mfcc import mfcc_mean, mfcc_means
+
+# Parameters of extract_audio_features; changing them starts a new feature store
+FEATURE_PARAMS = {'sr': 22050, 'duration': 3, 'n_mfcc': 40}
+FEATURE_CACHE_DIR = 'datasets/feature_cache/audio'
+
+# Files decoded per worker task; their MFCCs are computed in one vectorized pass
+FILES_PER_TASK = 32
+
+def extract_audio_features(file_path, sr=22050, duration=3, n_mfcc=40):
     '''
     Extract MFCC features from audio file
     '''
     try:
-        audio, sr = librosa.load(file_path, duration=3, sr=22050)
-        mfcc = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=40)
-        mfcc_processed = np.mean(mfcc.T, axis=0)
-        return mfcc_processed
+        audio, sr = librosa.load(file_path, duration=duration, sr=sr)
+        return mfcc_mean(audio, sr, n_mfcc)
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
         return None
 
-def load_audio_data(csv_path):
+def extract_audio_features_batch(file_paths, sr=22050, duration=3, n_mfcc=40):
+    '''
+    Extract MFCC features from several audio files; None for files that fail
+
+    The files are decoded one by one, then the MFCCs of all of them are
+    computed together (ml/mfcc.py), batching clips of equal length.
+    '''
+    clips, loaded = [], []
+    for i, file_path in enumerate(file_paths):
+        try:
+            audio, _ = librosa.load(file_path, duration=duration, sr=sr)
+            if not len(audio):
+                raise ValueError('no samples')
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            continue
+        clips.append(audio)
+        loaded.append(i)
+
+    features = [None] * len(file_paths)
+    if clips:
+        for i, vector in zip(loaded, mfcc_means(clips, sr, n_mfcc)):
+            features[i] = vector
+    return features
+
+def extract_missing_features(store, paths, workers=None):
+    '''
+    Extract features for files not yet in the store across a process pool
+    '''
+    pending = {}
+    for path in paths:
+        key = store.key(path)
+        if key is not None and key not in store:
+            pending[key] = path
+    if not pending:
+        return
+
+    print(f"Extracting features for {len(pending)} new or changed files...")
+    keys, vectors = [], []
+    pending_keys, pending_paths = list(pending), list(pending.values())
+    tasks = [pending_paths[i:i + FILES_PER_TASK] for i in range(0, len(pending_paths), FILES_PER_TASK)]
+    extract = partial(extract_audio_features_batch, **store.params)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        done = 0
+        for features in executor.map(extract, tasks):
+            for key, feature in zip(pending_keys[done:done + len(features)], features):
+                if feature is not None:
+                    keys.append(key)
+                    vectors.append(feature)
+
+            done += len(features)
+            print(f"Processed {done} files...")
+
+    store.add(keys, vectors)
+
+def load_audio_data(csv_path, workers=None, cache_dir=FEATURE_CACHE_DIR):
     '''
     Load audio emotion dataset
     CSV should have columns: 'file_path', 'emotion'
     Audio files should be referenced in the CSV
+
+    Features are cached in a memory-mapped store under cache_dir keyed by
+    file path, mtime and FEATURE_PARAMS; only new or changed files are
+    extracted, in parallel across `workers` processes (default: all cores).
     '''
     data = pd.read_csv(csv_path)
+    paths = data['file_path'].tolist()
 
-    features = []
-    emotions = []
+    store = FeatureStore(cache_dir, FEATURE_PARAMS, dim=FEATURE_PARAMS['n_mfcc'])
+    extract_missing_features(store, paths, workers=workers)
 
-    for idx, row in data.iterrows():
-        feature = extract_audio_features(row['file_path'])
-        if feature is not None:
-            features.append(feature)
-            emotions.append(row['emotion'])
+    keys = [store.key(path) for path in paths]
+    found = [i for i, key in enumerate(keys) if key in store]
+    if len(found) < len(paths):
+        print(f"Skipped {len(paths) - len(found)} files that could not be processed")
 
-        if idx % 100 == 0:
-            print(f"Processed {idx} files...")
+    features = store.get([keys[i] for i in found])
+    emotions = data['emotion'].values[found]
 
-    return np.array(features), np.array(emotions)
+    return features, emotions
 
-def create_audio_model(input_shape=(40,), num_classes=7):
+def create_audio_model(input_shape=(40,), num_classes=7, hidden_units=(256, 128, 64), dropout=0.3,
+                       learning_rate=0.001):
     '''
     Create neural network for audio emotion recognition
+
+    One dense layer per entry of hidden_units; the defaults are the
+    production model, other values are explored by ml/sweep.py.
     '''
     model = Sequential()
 
-    model.add(Dense(256, activation='relu', input_shape=input_shape))
-    model.add(Dropout(0.3))
-    model.add(Dense(128, activation='relu'))
-    model.add(Dropout(0.3))
-    model.add(Dense(64, activation='relu'))
-    model.add(Dropout(0.3))
+    for i, units in enumerate(hidden_units):
+        if i == 0:
+            model.add(Dense(units, activation='relu', input_shape=input_shape))
+        else:
+            model.add(Dense(units, activation='relu'))
+        model.add(Dropout(dropout))
     model.add(Dense(num_classes, activation='softmax'))
 
     model.compile(
-        optimizer='adam',
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
         loss='sparse_categorical_crossentropy',
         metrics=['accuracy']
     )
 
     return model
 
-def train_audio_model(csv_path='datasets/emotion.csv', epochs=50, batch_size=32):
+def train_audio_model(csv_path='datasets/emotion.csv', epochs=50, batch_size=32, model_params=None):
     '''
     Train the audio emotion recognition model
+
+    model_params are passed to create_audio_model, e.g. the best trial of ml/sweep.py.
     '''
     print("Loading audio dataset...")
     X, y = load_audio_data(csv_path)
@@ -81,7 +156,9 @@ def train_audio_model(csv_path='datasets/emotion.csv', epochs=50, batch_size=32)
     print(f"Training samples: {len(X_train)}")
     print(f"Validation samples: {len(X_val)}")
 
-    model = create_audio_model(input_shape=(X.shape[1],), num_classes=len(le.classes_))
+    model = create_audio_model(
+        input_shape=(X.shape[1],), num_classes=len(le.classes_), **(model_params or {})
+    )
     print(model.summary())
 
     history = model.fit(
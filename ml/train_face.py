@@ -1,106 +1,183 @@
+import os
+
 import numpy as np
 import pandas as pd
+import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv2D, MaxPooling2D, Dense, Dropout, Flatten, BatchNormalization
+from tensorflow.keras.layers import RandomRotation, RandomTranslation, RandomFlip, RandomZoom
 from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from sklearn.model_selection import train_test_split
 import cv2
 
+FACE_SIZE = 48
+NUM_CLASSES = 7
+
+def fer2013_cache_paths(csv_path):
+    base = os.path.splitext(csv_path)[0]
+    return base + '.pixels.npy', base + '.labels.npy'
+
+def parse_fer2013_pixels(pixels):
+    '''
+    Parse space-separated pixel strings into one (n, 48, 48) uint8 array
+    '''
+    flat = np.fromstring(' '.join(pixels), dtype=np.uint8, sep=' ')
+    return flat.reshape(len(pixels), FACE_SIZE, FACE_SIZE)
+
+def load_fer2013_arrays(csv_path):
+    '''
+    FER2013 faces as memory-mapped uint8 (n, 48, 48) and labels as uint8 (n,)
+
+    The CSV is parsed once; the arrays are cached as .npy files beside it
+    and reused until the CSV changes.
+    '''
+    pixels_path, labels_path = fer2013_cache_paths(csv_path)
+    csv_mtime = os.path.getmtime(csv_path)
+
+    cached = all(os.path.exists(path) and os.path.getmtime(path) >= csv_mtime
+                 for path in (pixels_path, labels_path))
+    if not cached:
+        data = pd.read_csv(csv_path, usecols=['emotion', 'pixels'])
+        # Write to temporary names first so an interrupted run leaves no partial cache
+        np.save(pixels_path + '.tmp.npy', parse_fer2013_pixels(data['pixels'].tolist()))
+        np.save(labels_path + '.tmp.npy', data['emotion'].values.astype(np.uint8))
+        os.replace(pixels_path + '.tmp.npy', pixels_path)
+        os.replace(labels_path + '.tmp.npy', labels_path)
+
+    return np.load(pixels_path, mmap_mode='r'), np.load(labels_path)
+
 def load_fer2013(csv_path):
     '''
     Load and preprocess FER2013 dataset
     Place your fer2013.csv in the datasets folder
+
+    Returns normalized float32 faces (n, 48, 48, 1) and one-hot emotions.
+    Training streams batches from load_fer2013_arrays() instead.
     '''
-    data = pd.read_csv(csv_path)
+    pixels, labels = load_fer2013_arrays(csv_path)
 
-    pixels = data['pixels'].tolist()
-    width, height = 48, 48
-    faces = []
+    faces = (pixels.astype(np.float32) / 255.0)[..., np.newaxis]
+    emotions = np.eye(NUM_CLASSES, dtype=np.float32)[labels]
 
-    for pixel_sequence in pixels:
-        face = [int(pixel) for pixel in pixel_sequence.split(' ')]
-        face = np.asarray(face).reshape(width, height)
-        face = face / 255.0  # Normalize
-        faces.append(face.reshape(width, height, 1))
+    return faces, emotions
 
-    faces = np.asarray(faces)
-    emotions = pd.get_dummies(data['emotion']).values
+def create_augmenter():
+    '''
+    Random transforms matching the previous ImageDataGenerator settings
+    '''
+    return Sequential([
+        RandomRotation(15 / 360.0),
+        RandomTranslation(0.1, 0.1),
+        RandomFlip('horizontal'),
+        RandomZoom(0.1)
+    ])
+
+def make_face_dataset(pixels, labels, indices, batch_size=64, shuffle=False, augment=False):
+    '''
+    Streaming tf.data pipeline over the uint8 arrays
 
-    return faces, emotions
+    Each batch is gathered from the memory map and normalized to float32
+    on the fly, so the dataset is never held in memory as floats.
+    '''
+    def gather(batch_indices):
+        return pixels[batch_indices], labels[batch_indices]
+
+    def normalize(batch_pixels, batch_labels):
+        faces = tf.cast(batch_pixels, tf.float32)[..., tf.newaxis] / 255.0
+        faces.set_shape([None, FACE_SIZE, FACE_SIZE, 1])
+        batch_labels.set_shape([None])
+        return faces, tf.one_hot(tf.cast(batch_labels, tf.int32), NUM_CLASSES)
+
+    dataset = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if shuffle:
+        dataset = dataset.shuffle(len(indices), reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(
+        lambda batch_indices: tf.numpy_function(gather, [batch_indices], [tf.uint8, tf.uint8]),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    dataset = dataset.map(normalize, num_parallel_calls=tf.data.AUTOTUNE)
+
+    if augment:
+        augmenter = create_augmenter()
+        dataset = dataset.map(
+            lambda faces, emotions: (augmenter(faces, training=True), emotions),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+
+    return dataset.prefetch(tf.data.AUTOTUNE)
 
-def create_face_model():
+def create_face_model(width=32, dense_units=1024, dropout=0.25, dense_dropout=0.5, learning_rate=0.0001):
     '''
     Create CNN model for facial emotion recognition
     7 emotions: Angry, Disgust, Fear, Happy, Sad, Surprise, Neutral
+
+    The conv blocks have width, 2x, 4x and 8x width filters; the defaults
+    are the production model, other values are explored by ml/sweep.py.
     '''
     model = Sequential()
 
     # First conv block
-    model.add(Conv2D(32, kernel_size=(3, 3), activation='relu', input_shape=(48, 48, 1)))
-    model.add(Conv2D(64, kernel_size=(3, 3), activation='relu'))
+    model.add(Conv2D(width, kernel_size=(3, 3), activation='relu', input_shape=(48, 48, 1)))
+    model.add(Conv2D(width * 2, kernel_size=(3, 3), activation='relu'))
     model.add(MaxPooling2D(pool_size=(2, 2)))
     model.add(BatchNormalization())
-    model.add(Dropout(0.25))
+    model.add(Dropout(dropout))
 
     # Second conv block
-    model.add(Conv2D(128, kernel_size=(3, 3), activation='relu'))
+    model.add(Conv2D(width * 4, kernel_size=(3, 3), activation='relu'))
     model.add(MaxPooling2D(pool_size=(2, 2)))
     model.add(BatchNormalization())
-    model.add(Dropout(0.25))
+    model.add(Dropout(dropout))
 
     # Third conv block
-    model.add(Conv2D(256, kernel_size=(3, 3), activation='relu'))
+    model.add(Conv2D(width * 8, kernel_size=(3, 3), activation='relu'))
     model.add(MaxPooling2D(pool_size=(2, 2)))
     model.add(BatchNormalization())
-    model.add(Dropout(0.25))
+    model.add(Dropout(dropout))
 
     # Fully connected layers
     model.add(Flatten())
-    model.add(Dense(1024, activation='relu'))
-    model.add(Dropout(0.5))
+    model.add(Dense(dense_units, activation='relu'))
+    model.add(Dropout(dense_dropout))
     model.add(Dense(7, activation='softmax'))
 
     model.compile(
-        optimizer=Adam(learning_rate=0.0001),
+        optimizer=Adam(learning_rate=learning_rate),
         loss='categorical_crossentropy',
         metrics=['accuracy']
     )
 
     return model
 
-def train_face_model(csv_path='datasets/fer2013.csv', epochs=50, batch_size=64):
+def train_face_model(csv_path='datasets/fer2013.csv', epochs=50, batch_size=64, model_params=None):
     '''
     Train the facial emotion recognition model
+
+    model_params are passed to create_face_model, e.g. the best trial of ml/sweep.py.
     '''
     print("Loading FER2013 dataset...")
-    X, y = load_fer2013(csv_path)
+    pixels, labels = load_fer2013_arrays(csv_path)
 
-    X_train, X_val, y_train, y_val = train_test_split(
-        X, y, test_size=0.2, random_state=42
+    train_idx, val_idx = train_test_split(
+        np.arange(len(labels)), test_size=0.2, random_state=42
     )
 
-    print(f"Training samples: {len(X_train)}")
-    print(f"Validation samples: {len(X_val)}")
+    print(f"Training samples: {len(train_idx)}")
+    print(f"Validation samples: {len(val_idx)}")
 
-    # Data augmentation
-    datagen = ImageDataGenerator(
-        rotation_range=15,
-        width_shift_range=0.1,
-        height_shift_range=0.1,
-        horizontal_flip=True,
-        zoom_range=0.1
-    )
+    # Data augmentation runs per batch inside the input pipeline
+    train_data = make_face_dataset(pixels, labels, train_idx, batch_size, shuffle=True, augment=True)
+    val_data = make_face_dataset(pixels, labels, val_idx, batch_size)
 
-    model = create_face_model()
+    model = create_face_model(**(model_params or {}))
     print(model.summary())
 
     history = model.fit(
-        datagen.flow(X_train, y_train, batch_size=batch_size),
-        validation_data=(X_val, y_val),
+        train_data,
+        validation_data=val_data,
         epochs=epochs,
-        steps_per_epoch=len(X_train) // batch_size,
         verbose=1
     )
 
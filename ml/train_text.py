@@ -1,3 +1,5 @@
+import json
+
 import numpy as np
 import pandas as pd
 from tensorflow import keras
@@ -5,9 +7,18 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Embedding, LSTM, Dense, Dropout, Bidirectional
 from tensorflow.keras.preprocessing.text import Tokenizer
 from tensorflow.keras.preprocessing.sequence import pad_sequences
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import LabelEncoder
 
+from ml.text_vocab import export_vocabulary
+from ml.predict import DEFAULT_TEXT_CASCADE_THRESHOLD
+
+# Confidence thresholds compared in the cascade report
+CASCADE_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
 def load_text_data(csv_path):
     '''
     Load and preprocess text emotion dataset
@@ -21,32 +32,80 @@ def load_text_data(csv_path):
 
     return texts, emotions
 
-def create_text_model(vocab_size=10000, max_length=100, num_classes=7):
+def create_text_model(vocab_size=10000, max_length=100, num_classes=7, embedding_dim=128,
+                      lstm_units=(128, 64), dense_units=64, dropout=0.3, learning_rate=0.001):
     '''
     Create LSTM model for text emotion recognition
+
+    One bidirectional LSTM layer per entry of lstm_units; the defaults are
+    the production model, other values are explored by ml/sweep.py.
     '''
     model = Sequential()
 
-    model.add(Embedding(vocab_size, 128, input_length=max_length))
-    model.add(Bidirectional(LSTM(128, return_sequences=True)))
-    model.add(Dropout(0.3))
-    model.add(Bidirectional(LSTM(64)))
-    model.add(Dropout(0.3))
-    model.add(Dense(64, activation='relu'))
-    model.add(Dropout(0.3))
+    model.add(Embedding(vocab_size, embedding_dim, input_length=max_length))
+    for i, units in enumerate(lstm_units):
+        model.add(Bidirectional(LSTM(units, return_sequences=i < len(lstm_units) - 1)))
+        model.add(Dropout(dropout))
+    model.add(Dense(dense_units, activation='relu'))
+    model.add(Dropout(dropout))
     model.add(Dense(num_classes, activation='softmax'))
 
     model.compile(
-        optimizer='adam',
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
         loss='sparse_categorical_crossentropy',
         metrics=['accuracy']
     )
 
     return model
 
-def train_text_model(csv_path='datasets/text.csv', epochs=30, batch_size=32):
+def create_linear_text_model(max_features=50000, ngram_range=(1, 2), min_df=2, C=4.0):
+    '''
+    TF-IDF word n-grams plus logistic regression: the cheap first stage of the text cascade
+    '''
+    return make_pipeline(
+        TfidfVectorizer(ngram_range=ngram_range, min_df=min_df, max_features=max_features, sublinear_tf=True),
+        LogisticRegression(C=C, max_iter=1000)
+    )
+
+def cascade_report(linear_model, model, texts, padded, labels, le, thresholds=CASCADE_THRESHOLDS):
+    '''
+    Share of texts the linear stage answers (hit rate) and the accuracy of
+    the cascade at each threshold, against the BiLSTM alone
+    '''
+    linear_probabilities = linear_model.predict_proba(texts)
+    linear_predictions = le.transform(linear_model.classes_[np.argmax(linear_probabilities, axis=1)])
+    linear_confidences = linear_probabilities.max(axis=1)
+    bilstm_predictions = np.argmax(model.predict(padded, verbose=0), axis=1)
+
+    report = {
+        'bilstm_accuracy': float(np.mean(bilstm_predictions == labels)),
+        'linear_accuracy': float(np.mean(linear_predictions == labels)),
+        'cascade': []
+    }
+    for threshold in thresholds:
+        hits = linear_confidences >= threshold
+        predictions = np.where(hits, linear_predictions, bilstm_predictions)
+        report['cascade'].append({
+            'threshold': threshold,
+            'hit_rate': float(np.mean(hits)),
+            'accuracy': float(np.mean(predictions == labels)),
+            'agreement': float(np.mean(predictions == bilstm_predictions))
+        })
+
+    print(f"BiLSTM only: accuracy {report['bilstm_accuracy']:.4f}")
+    print(f"Linear only: accuracy {report['linear_accuracy']:.4f}")
+    print(f"{'threshold':>9}  {'hit rate':>8}  {'accuracy':>8}  {'vs BiLSTM':>9}  {'agreement':>9}")
+    for row in report['cascade']:
+        print(f"{row['threshold']:>9.2f}  {row['hit_rate']:>8.1%}  {row['accuracy']:>8.4f}  "
+              f"{row['accuracy'] - report['bilstm_accuracy']:>+9.4f}  {row['agreement']:>9.1%}")
+
+    return report
+
+def train_text_model(csv_path='datasets/text.csv', epochs=30, batch_size=32, model_params=None):
     '''
     Train the text emotion recognition model
+
+    model_params are passed to create_text_model, e.g. the best trial of ml/sweep.py.
     '''
     print("Loading text dataset...")
     texts, emotions = load_text_data(csv_path)
@@ -61,14 +120,14 @@ def train_text_model(csv_path='datasets/text.csv', epochs=30, batch_size=32):
     sequences = tokenizer.texts_to_sequences(texts)
     padded = pad_sequences(sequences, maxlen=100, padding='post', truncating='post')
 
-    X_train, X_val, y_train, y_val = train_test_split(
-        padded, emotions_encoded, test_size=0.2, random_state=42
+    X_train, X_val, texts_train, texts_val, y_train, y_val = train_test_split(
+        padded, texts.astype(str), emotions_encoded, test_size=0.2, random_state=42
     )
 
     print(f"Training samples: {len(X_train)}")
     print(f"Validation samples: {len(X_val)}")
 
-    model = create_text_model(num_classes=len(le.classes_))
+    model = create_text_model(num_classes=len(le.classes_), **(model_params or {}))
     print(model.summary())
 
     history = model.fit(
@@ -79,6 +138,16 @@ def train_text_model(csv_path='datasets/text.csv', epochs=30, batch_size=32):
         verbose=1
     )
 
+    # First stage of the cascade, trained on the same split; it predicts
+    # the dataset's label names so serving it needs no label encoder
+    print("Training TF-IDF + logistic regression first stage...")
+    linear_model = create_linear_text_model()
+    linear_model.fit(texts_train, le.classes_[y_train])
+
+    print("Cascade on the validation set:")
+    report = cascade_report(linear_model, model, texts_val, X_val, y_val, le,
+                            thresholds=sorted(set(CASCADE_THRESHOLDS) | {DEFAULT_TEXT_CASCADE_THRESHOLD}))
+
     # Save model and tokenizer
     model.save('static/models/text_emotion_model.h5')
 
@@ -88,6 +157,14 @@ def train_text_model(csv_path='datasets/text.csv', epochs=30, batch_size=32):
     with open('static/models/text_label_encoder.pkl', 'wb') as f:
         pickle.dump(le, f)
 
+    # Compact vocabulary used for inference instead of the pickled tokenizer
+    export_vocabulary(tokenizer, 'static/models/text_vocab.npz', maxlen=100)
+
+    with open('static/models/text_linear_model.pkl', 'wb') as f:
+        pickle.dump(linear_model, f)
+    with open('static/models/text_cascade_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
     print("Model saved to static/models/text_emotion_model.h5")
 
     return history
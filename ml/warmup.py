@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from ml.media import AUDIO_SAMPLE_RATE, AUDIO_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Warmup state per modality: 'pending', 'ready' or 'failed'
+PENDING = 'pending'
+READY = 'ready'
+FAILED = 'failed'
+
+_state = {}
+_lock = threading.Lock()
+
+def _set_state(modality, **fields):
+    with _lock:
+        _state.setdefault(modality, {}).update(fields)
+
+def dummy_batch(modality):
+    '''
+    One preprocessed sample per modality, built with the serving code path
+
+    Running it imports OpenCV/librosa and compiles their first-call paths
+    as well as the model.
+    '''
+    if modality == 'face':
+        from ml.face import detect_faces, crop_faces
+        gray = np.zeros((96, 96), dtype=np.uint8)
+        return crop_faces(gray, detect_faces(gray))
+
+    if modality == 'text':
+        from ml.predict import preprocess_texts
+        return preprocess_texts(['warmup'])
+
+    if modality == 'audio':
+        # Uploads are decoded with librosa; import it now rather than on the first request
+        import librosa  # noqa: F401
+        from ml.mfcc import mfcc_means_batch
+        silence = np.zeros((1, AUDIO_SAMPLE_RATE * AUDIO_DURATION), dtype=np.float32)
+        return mfcc_means_batch(silence, AUDIO_SAMPLE_RATE)
+
+    raise ValueError(f'Unknown modality: {modality}')
+
+def warm_modality(modality):
+    '''
+    Load a modality's model and run one dummy prediction through it
+    '''
+    from ml.predict import run_model, decode_predictions
+
+    started = time.perf_counter()
+    try:
+        decode_predictions(modality, run_model(modality, dummy_batch(modality)))
+    except Exception as e:
+        # /readyz reports this modality as failed; the traceback says why
+        logger.exception('Error warming up %s model', modality)
+        _set_state(modality, status=FAILED, error=str(e))
+        return False
+
+    _set_state(modality, status=READY, error=None, seconds=round(time.perf_counter() - started, 3))
+    return True
+
+def warmup(modalities):
+    for modality in modalities:
+        warm_modality(modality)
+
+def start_warmup(modalities):
+    '''
+    Warm the given modalities in a background thread; see readiness()
+    '''
+    modalities = list(modalities)
+    for modality in modalities:
+        _set_state(modality, status=PENDING, error=None)
+
+    thread = threading.Thread(target=warmup, args=(modalities,), name='model-warmup', daemon=True)
+    thread.start()
+    return thread
+
+def readiness():
+    '''
+    (ready, per-modality state); ready once every warmed modality succeeded
+    '''
+    with _lock:
+        state = {modality: dict(fields) for modality, fields in _state.items()}
+    return all(fields['status'] == READY for fields in state.values()), state
@@ -5,3 +5,25 @@ from flask_sqlalchemy import SQLAlchemy
 # Import this `db` from model modules and initialize it with the Flask
 # app in `app.py` using `db.init_app(app)`.
 db = SQLAlchemy()
+
+def configure_sqlite(engine, journal_mode='WAL', synchronous='NORMAL', busy_timeout_ms=5000):
+    '''
+    Apply pragmas to every new SQLite connection of the engine
+
+    WAL lets readers run alongside the writer, synchronous=NORMAL skips the
+    fsync on each commit (still safe against corruption in WAL mode) and
+    busy_timeout makes concurrent workers wait for the write lock instead of
+    failing with "database is locked". No-op for other databases.
+    '''
+    if engine.dialect.name != 'sqlite':
+        return
+
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.close()
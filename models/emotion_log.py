@@ -9,5 +9,10 @@ class EmotionLog(db.Model):
     detection_type = db.Column(db.String(20), nullable=False)  # 'face', 'text', or 'audio'
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Serves per-user history and range queries newest first
+        db.Index('ix_emotion_log_user_timestamp', 'user_id', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<EmotionLog {self.emotion} at {self.timestamp}>'
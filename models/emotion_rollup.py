@@ -0,0 +1,107 @@
+from datetime import datetime
+from sqlalchemy import event, func, select
+from models import db
+from models.emotion_log import EmotionLog
+
+class EmotionDailyRollup(db.Model):
+    '''
+    Per-user daily counts of EmotionLog rows, kept in step with every insert
+    '''
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    detection_type = db.Column(db.String(20), nullable=False)
+    emotion = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'detection_type', 'emotion', name='uq_emotion_rollup_key'),
+    )
+
+    def __repr__(self):
+        return f'<EmotionDailyRollup {self.day} {self.emotion} x{self.count}>'
+
+KEY_COLUMNS = ('user_id', 'day', 'detection_type', 'emotion')
+
+def _upsert(connection, key, count, confidence_sum):
+    table = EmotionDailyRollup.__table__
+    values = dict(zip(KEY_COLUMNS, key), count=count, confidence_sum=confidence_sum)
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(**values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                'count': table.c.count + statement.excluded.count,
+                'confidence_sum': table.c.confidence_sum + statement.excluded.confidence_sum
+            }
+        ))
+        return
+
+    match = [table.c[column] == value for column, value in zip(KEY_COLUMNS, key)]
+    result = connection.execute(table.update().where(*match).values(
+        count=table.c.count + count,
+        confidence_sum=table.c.confidence_sum + confidence_sum
+    ))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**values))
+
+@event.listens_for(db.session.__class__, 'before_flush')
+def _stamp_new_logs(session, flush_context, instances):
+    # The rollup day must match the stored timestamp, so set it before insert
+    for obj in session.new:
+        if isinstance(obj, EmotionLog) and obj.timestamp is None:
+            obj.timestamp = datetime.utcnow()
+
+@event.listens_for(db.session.__class__, 'after_flush')
+def _update_rollups(session, flush_context):
+    '''
+    Fold newly inserted EmotionLog rows into the rollup in the same transaction
+    '''
+    totals = {}
+    for obj in session.new:
+        if isinstance(obj, EmotionLog):
+            key = (obj.user_id, obj.timestamp.date(), obj.detection_type, obj.emotion)
+            count, confidence_sum = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, confidence_sum + obj.confidence)
+
+    if totals:
+        connection = session.connection()
+        for key, (count, confidence_sum) in totals.items():
+            _upsert(connection, key, count, confidence_sum)
+
+def backfill_rollups():
+    '''
+    Rebuild the rollup table from all existing EmotionLog rows
+    '''
+    table = EmotionDailyRollup.__table__
+    day = func.date(EmotionLog.timestamp)
+    source = select(
+        EmotionLog.user_id, day, EmotionLog.detection_type, EmotionLog.emotion,
+        func.count(EmotionLog.id), func.sum(EmotionLog.confidence)
+    ).group_by(EmotionLog.user_id, day, EmotionLog.detection_type, EmotionLog.emotion)
+
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['user_id', 'day', 'detection_type', 'emotion', 'count', 'confidence_sum'], source
+    ))
+    db.session.commit()
+    return db.session.query(func.count(EmotionDailyRollup.id)).scalar()
+
+def backfill_rollups_if_empty():
+    '''
+    Backfill when the rollup table is empty but emotion logs exist, as right
+    after upgrading a database created before the rollups; returns the rows
+    built, or 0 if nothing was needed
+    '''
+    if db.session.query(EmotionDailyRollup.id).first() is not None:
+        return 0
+    if db.session.query(EmotionLog.id).first() is None:
+        return 0
+    return backfill_rollups()
@@ -0,0 +1,30 @@
+import logging
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+def upgrade_schema(backfill=True):
+    '''
+    Bring an existing database up to the current models
+
+    create_all() only creates missing tables, so indexes added to a model
+    after its table exists are created here, and unless backfill is False
+    a new (empty) rollup table is filled from the existing emotion logs.
+    Safe to run repeatedly. Returns the names of the created indexes.
+    '''
+    from models.emotion_rollup import backfill_rollups_if_empty
+
+    db.create_all()
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if not db.inspect(db.engine).has_index(table.name, index.name):
+                index.create(db.engine)
+                created.append(index.name)
+
+    if backfill:
+        rows = backfill_rollups_if_empty()
+        if rows:
+            logger.info('Backfilled %d rollup rows from existing emotion logs', rows)
+    return created
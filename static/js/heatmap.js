@@ -1,9 +1,12 @@
 // Heatmap visualization utilities
 
+// data maps 'YYYY-MM-DD' to the number of detections on that day
 function createCalendarHeatmap(data, containerId) {
     const container = document.getElementById(containerId);
     if (!container) return;
 
+    const maxCount = Math.max(1, ...Object.values(data));
+
     const today = new Date();
     const yearAgo = new Date(today);
     yearAgo.setFullYear(yearAgo.getFullYear() - 1);
@@ -16,12 +19,12 @@ function createCalendarHeatmap(data, containerId) {
         const week = [];
         for (let i = 0; i < 7; i++) {
             const dateStr = currentDate.toISOString().split('T')[0];
-            const intensity = data[dateStr] ? data[dateStr].intensity / 5 : 0;
+            const count = data[dateStr] || 0;
 
             week.push({
                 date: dateStr,
-                intensity: intensity,
-                count: data[dateStr] ? 1 : 0
+                intensity: count / maxCount,
+                count: count
             });
 
             currentDate.setDate(currentDate.getDate() + 1);
@@ -33,7 +36,7 @@ function createCalendarHeatmap(data, containerId) {
     let html = '<div class="heatmap-grid">';
     weeks.forEach(week => {
         week.forEach(day => {
-            const color = `rgba(99, 102, 241, ${day.intensity})`;
+            const color = day.count ? `rgba(99, 102, 241, ${0.2 + 0.8 * day.intensity})` : '#eef2ff';
             html += `<div class="heatmap-cell" 
                           style="background-color: ${color};" 
                           title="${day.date}: ${day.count} entries"
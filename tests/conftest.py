@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Import the app's packages (ml, utils, models) when pytest runs from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def app():
+    '''
+    Flask app on an empty in-memory SQLite database
+    '''
+    from flask import Flask
+    from models import db
+    from models.emotion_log import EmotionLog  # noqa: F401
+    from models.user import User  # noqa: F401  (emotion_log.user_id references its table)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ml.batching import MicroBatcher
+
+class RecordingModel:
+    '''
+    Doubles its input and remembers the size of every batch it was given
+    '''
+
+    def __init__(self, fail_when=None):
+        self.batch_sizes = []
+        self.fail_when = fail_when
+
+    def __call__(self, batch):
+        self.batch_sizes.append(len(batch))
+        if self.fail_when is not None and self.fail_when(batch):
+            raise RuntimeError('model failed')
+        return batch * 2
+
+def submit_together(batcher, values):
+    # Queue all samples before the batcher thread can flush any of them
+    return [batcher.submit(np.array([value], dtype=np.float32)) for value in values]
+
+def test_flushes_when_batch_is_full():
+    model = RecordingModel()
+    # A long wait: only the size limit can flush these
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=10000)
+
+    futures = submit_together(batcher, range(8))
+    results = [future.result(timeout=5) for future in futures]
+
+    assert [float(row[0]) for row in results] == [2.0 * i for i in range(8)]
+    assert model.batch_sizes == [4, 4]
+    assert batcher.stats.snapshot()['batch_size_histogram'] == {4: 2}
+
+def test_flushes_partial_batch_after_max_wait():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=16, max_wait_ms=50)
+
+    started = time.perf_counter()
+    futures = submit_together(batcher, [1, 2, 3])
+    results = [future.result(timeout=5) for future in futures]
+    elapsed = time.perf_counter() - started
+
+    assert [float(row[0]) for row in results] == [2.0, 4.0, 6.0]
+    assert model.batch_sizes == [3]
+    assert elapsed >= 0.05
+
+def test_concurrent_callers_get_their_own_rows():
+    batcher = MicroBatcher(RecordingModel(), max_batch_size=8, max_wait_ms=20)
+    results = {}
+
+    def call(value):
+        results[value] = float(batcher.predict(np.array([value], dtype=np.float32), timeout=5)[0])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: 2.0 * i for i in range(20)}
+
+def test_failed_batch_raises_in_each_caller_and_batcher_recovers():
+    # Only batches containing a negative sample fail
+    model = RecordingModel(fail_when=lambda batch: (batch < 0).any())
+    batcher = MicroBatcher(model, max_batch_size=2, max_wait_ms=10000)
+
+    failing = submit_together(batcher, [-1, 5])
+    for future in failing:
+        with pytest.raises(RuntimeError, match='model failed'):
+            future.result(timeout=5)
+
+    # The next batch is scored normally
+    ok = submit_together(batcher, [3, 4])
+    assert [float(future.result(timeout=5)[0]) for future in ok] == [6.0, 8.0]
+
+    stats = batcher.stats.snapshot()
+    assert stats['errors'] == 1
+    assert stats['batches'] == 2
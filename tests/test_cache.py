@@ -0,0 +1,83 @@
+import io
+
+import pytest
+
+from ml import cache as cache_module
+from ml.cache import MemoryCacheBackend, SqliteCacheBackend, PredictionCache, cache_key, create_cache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'time', clock)
+    return clock
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path, clock):
+    if request.param == 'memory':
+        return MemoryCacheBackend(max_entries=2, ttl=60)
+    return SqliteCacheBackend(str(tmp_path / 'cache.db'), max_entries=2, ttl=60)
+
+def test_get_returns_what_was_set(backend):
+    assert backend.get('a') == (None, False)
+    backend.set('a', ('Happy', 0.9))
+    assert backend.get('a') == (('Happy', 0.9), False)
+    assert len(backend) == 1
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    backend.set('a', ('Happy', 0.9))
+    clock.now += 1
+    backend.set('b', ('Sad', 0.8))
+    clock.now += 1
+    # Reading 'a' makes 'b' the least recently used
+    backend.get('a')
+    clock.now += 1
+    assert backend.set('c', ('Angry', 0.7)) == 1
+
+    assert len(backend) == 2
+    assert backend.get('b') == (None, False)
+    assert backend.get('a')[0] == ('Happy', 0.9)
+    assert backend.get('c')[0] == ('Angry', 0.7)
+
+def test_entries_expire_after_ttl(backend, clock):
+    backend.set('a', ('Happy', 0.9))
+    clock.now += 59
+    assert backend.get('a')[0] == ('Happy', 0.9)
+    clock.now += 2
+    assert backend.get('a') == (None, True)
+    assert len(backend) == 0
+
+def test_sqlite_backend_survives_reopening(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    SqliteCacheBackend(path).set('a', ('Happy', 0.9))
+    assert SqliteCacheBackend(path).get('a') == (('Happy', 0.9), False)
+
+def test_prediction_cache_counts_hits_misses_and_evictions(clock):
+    cache = PredictionCache(MemoryCacheBackend(max_entries=1, ttl=60))
+    assert cache.get('a') is None
+    cache.set('a', ('Happy', 0.9))
+    assert cache.get('a') == ('Happy', 0.9)
+    cache.set('b', ('Sad', 0.8))
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (1, 1, 1, 1)
+
+def test_cache_key_normalizes_text_and_hashes_uploads_by_content():
+    assert cache_key('text', 'I am  Happy', 'v1') == cache_key('text', 'i am happy', 'v1')
+    assert cache_key('text', 'happy', 'v1') != cache_key('text', 'happy', 'v2')
+
+    buffer = io.BytesIO(b'image bytes')
+    assert cache_key('face', buffer, 'v1') == cache_key('face', b'image bytes', 'v1')
+    # The buffer is left where it was for the predictor
+    assert buffer.tell() == 0
+
+def test_create_cache_none_disables_caching():
+    assert create_cache('none') is None
+    with pytest.raises(ValueError):
+        create_cache('redis')
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db
+from models.emotion_log import EmotionLog
+from utils.history import history_page, encode_cursor, decode_cursor
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+def add_logs(app, timestamps, user_id=1, emotion='Happy', detection_type='text'):
+    with app.app_context():
+        db.session.add_all([
+            EmotionLog(user_id=user_id, emotion=emotion, confidence=0.5,
+                       detection_type=detection_type, timestamp=timestamp)
+            for timestamp in timestamps
+        ])
+        db.session.commit()
+
+def all_pages(app, limit, **filters):
+    pages, cursor = [], None
+    with app.app_context():
+        while True:
+            page = history_page(1, cursor=cursor, limit=limit, **filters)
+            pages.append([item['id'] for item in page['items']])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return pages
+
+def test_pages_cover_rows_with_equal_timestamps_once(app):
+    # Seven rows share one timestamp, so pages split inside the tie
+    add_logs(app, [START] * 7 + [START + timedelta(minutes=1), START - timedelta(minutes=1)])
+
+    pages = all_pages(app, limit=2)
+    ids = [log_id for page in pages for log_id in page]
+
+    assert len(ids) == len(set(ids)) == 9
+    with app.app_context():
+        expected = [log.id for log in EmotionLog.query.order_by(
+            EmotionLog.timestamp.desc(), EmotionLog.id.desc())]
+    assert ids == expected
+    assert [len(page) for page in pages] == [2, 2, 2, 2, 1]
+
+def test_new_rows_do_not_shift_later_pages(app):
+    add_logs(app, [START] * 5)
+
+    with app.app_context():
+        first = history_page(1, limit=2)
+    # A detection logged while the user reads page one
+    add_logs(app, [START + timedelta(hours=1)])
+    with app.app_context():
+        second = history_page(1, cursor=first['next_cursor'], limit=2)
+
+    first_ids = [item['id'] for item in first['items']]
+    second_ids = [item['id'] for item in second['items']]
+    assert not set(first_ids) & set(second_ids)
+    assert second_ids == [first_ids[-1] - 1, first_ids[-1] - 2]
+
+def test_filters_apply_across_pages(app):
+    add_logs(app, [START] * 3, emotion='Sad')
+    add_logs(app, [START] * 3, emotion='Happy')
+    add_logs(app, [START] * 2, emotion='Sad', user_id=2)
+
+    pages = all_pages(app, limit=2, emotion='Sad')
+    with app.app_context():
+        sad = {log.id for log in EmotionLog.query.filter_by(user_id=1, emotion='Sad')}
+    assert {log_id for page in pages for log_id in page} == sad
+
+def test_exact_page_size_has_no_next_cursor(app):
+    add_logs(app, [START] * 2)
+    with app.app_context():
+        page = history_page(1, limit=2)
+    assert len(page['items']) == 2
+    assert page['next_cursor'] is None
+
+def test_cursor_round_trip_and_invalid_cursor(app):
+    log = EmotionLog(id=42, timestamp=START)
+    assert decode_cursor(encode_cursor(log)) == (START, 42)
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
@@ -0,0 +1,93 @@
+from sqlalchemy.exc import OperationalError
+
+from models.emotion_log import EmotionLog
+from utils.log_writer import EmotionLogWriter, MAX_BATCH_ATTEMPTS
+
+GOOD = (1, 'Happy', 0.9, 'text')
+# emotion is NOT NULL, so this row fails on every attempt
+BAD = (1, None, 0.5, 'text')
+
+def stored(app):
+    with app.app_context():
+        return EmotionLog.query.count()
+
+def writer(app, **kwargs):
+    # Large thresholds keep the background thread idle; tests flush by hand
+    kwargs.setdefault('flush_rows', 1000)
+    kwargs.setdefault('flush_interval', 60)
+    return EmotionLogWriter(app, **kwargs)
+
+def test_sync_mode_commits_immediately(app):
+    log_writer = writer(app, mode='sync')
+    log_writer.log(*GOOD)
+    assert stored(app) == 1
+
+def test_flush_writes_queued_rows(app):
+    log_writer = writer(app)
+    log_writer.log_many([GOOD, GOOD])
+    assert stored(app) == 0
+    assert log_writer.flush() == 2
+    assert stored(app) == 2
+    assert log_writer.stats()['pending'] == 0
+
+def test_bad_row_is_dropped_after_batch_attempts(app):
+    log_writer = writer(app)
+    log_writer.log_many([GOOD, BAD, GOOD])
+
+    # The whole batch is kept and retried until MAX_BATCH_ATTEMPTS
+    for _ in range(MAX_BATCH_ATTEMPTS - 1):
+        assert log_writer.flush() == 0
+        assert log_writer.stats()['pending'] == 3
+    assert stored(app) == 0
+
+    # Then rows go one by one: the good ones land, the bad one is dropped
+    assert log_writer.flush() == 2
+    stats = log_writer.stats()
+    assert stats['dropped'] == 1
+    assert stats['pending'] == 0
+    assert stored(app) == 2
+
+    # Later logs are no longer held back
+    log_writer.log(*GOOD)
+    assert log_writer.flush() == 1
+    assert stored(app) == 3
+
+def test_rows_are_kept_while_database_is_unavailable(app, monkeypatch):
+    log_writer = writer(app)
+    log_writer.log_many([GOOD, GOOD])
+
+    def unavailable(rows):
+        raise OperationalError('INSERT', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(log_writer, '_write', unavailable)
+    for _ in range(MAX_BATCH_ATTEMPTS + 1):
+        assert log_writer.flush() == 0
+    stats = log_writer.stats()
+    assert stats['dropped'] == 0
+    assert stats['pending'] == 2
+
+    monkeypatch.undo()
+    assert log_writer.flush() == 2
+    assert stored(app) == 2
+
+def test_full_queue_writes_synchronously(app):
+    log_writer = writer(app, max_pending=2)
+    log_writer.log_many([GOOD, GOOD])
+    log_writer.log(*GOOD)
+
+    # The overflowing call committed its own row; the queue kept its two
+    stats = log_writer.stats()
+    assert stats['sync_fallbacks'] == 1
+    assert stats['pending'] == 2
+    assert stored(app) == 1
+
+    log_writer.close()
+    assert stored(app) == 3
+
+def test_full_queue_drops_rows_it_cannot_write(app):
+    log_writer = writer(app, max_pending=1)
+    log_writer.log(*GOOD)
+    log_writer.log(*BAD)
+    stats = log_writer.stats()
+    assert stats['dropped'] == 1
+    assert stats['pending'] == 1
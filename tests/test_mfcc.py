@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from ml.mfcc import TOLERANCE, mfcc_mean, mfcc_means, _test_clips
+
+librosa = pytest.importorskip('librosa')
+
+def librosa_means(clips):
+    return np.stack([
+        np.mean(librosa.feature.mfcc(y=clip, sr=22050, n_mfcc=40).T, axis=0)
+        for clip in clips
+    ])
+
+def test_mfcc_means_match_librosa():
+    # Silence, a short noise clip and tones with noise at the serving length
+    clips = _test_clips(8)
+    difference = np.max(np.abs(mfcc_means(clips) - librosa_means(clips)))
+    assert difference < TOLERANCE
+
+def test_mfcc_mean_matches_batched():
+    clips = _test_clips(4, seed=1)
+    batched = mfcc_means(clips)
+    for clip, expected in zip(clips, batched):
+        np.testing.assert_allclose(mfcc_mean(clip), expected, atol=1e-5)
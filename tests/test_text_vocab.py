@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from ml.text_vocab import VocabTokenizer
+
+keras_text = pytest.importorskip('tensorflow.keras.preprocessing.text')
+keras_sequence = pytest.importorskip('tensorflow.keras.preprocessing.sequence')
+
+MAXLEN = 12
+
+TRAIN_TEXTS = [
+    'I am so happy today!',
+    'This is the worst day, I feel sad and angry.',
+    'What a surprise... I did not expect that',
+    'i am scared of the dark',
+    'Happy happy joy joy',
+]
+
+TEXTS = [
+    # Only known words
+    'I am happy',
+    # Unknown words, punctuation and case
+    'Zebras ARE unexpectedly delightful, aren\'t they?',
+    # Longer than MAXLEN, truncated at the end
+    'happy sad angry ' * 10,
+    # Shorter than MAXLEN, padded at the end
+    'sad',
+    '',
+    '!!! ...',
+]
+
+def keras_encode(tokenizer, texts):
+    return keras_sequence.pad_sequences(
+        tokenizer.texts_to_sequences(texts), maxlen=MAXLEN, padding='post', truncating='post'
+    )
+
+@pytest.mark.parametrize('oov_token', ['<OOV>', None])
+@pytest.mark.parametrize('num_words', [8, None])
+def test_matches_keras_tokenizer(oov_token, num_words, tmp_path):
+    tokenizer = keras_text.Tokenizer(num_words=num_words, oov_token=oov_token)
+    tokenizer.fit_on_texts(TRAIN_TEXTS)
+    expected = keras_encode(tokenizer, TEXTS)
+
+    vocab = VocabTokenizer.from_keras(tokenizer, maxlen=MAXLEN)
+    assert vocab.texts_to_sequences(TEXTS) == tokenizer.texts_to_sequences(TEXTS)
+    np.testing.assert_array_equal(vocab.encode_batch(TEXTS), expected)
+
+    # The exported .npz serves the same sequences
+    vocab.save(tmp_path / 'vocab.npz')
+    np.testing.assert_array_equal(VocabTokenizer.load(tmp_path / 'vocab.npz').encode_batch(TEXTS), expected)
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db
+from models.emotion_log import EmotionLog
+from models.emotion_rollup import EmotionDailyRollup
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# Emotions counted as positive for the dashboard trend
+POSITIVE_EMOTIONS = ('Happy', 'Surprise')
+TREND_WINDOW = 7
+
+def period_expression(column, granularity):
+    '''
+    SQL expression labelling a timestamp with the start of its period (YYYY-MM-DD)
+    '''
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        return func.to_char(func.date_trunc(granularity, column), 'YYYY-MM-DD')
+
+    if dialect == 'mysql':
+        if granularity == 'month':
+            return func.date_format(column, '%Y-%m-01')
+        if granularity == 'week':
+            return func.date_format(func.subdate(column, func.weekday(column)), '%Y-%m-%d')
+        return func.date_format(column, '%Y-%m-%d')
+
+    # SQLite
+    if granularity == 'month':
+        return func.strftime('%Y-%m-01', column)
+    if granularity == 'week':
+        # Monday of the week
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.date(column)
+
+def parse_date(value, end_of_day=False):
+    '''
+    Parse YYYY-MM-DD; an end date includes the whole day
+    '''
+    if not value:
+        return None
+    parsed = datetime.strptime(value, '%Y-%m-%d')
+    return parsed + timedelta(days=1) if end_of_day else parsed
+
+def _filtered(query, user_id, start, end):
+    query = query.filter(EmotionLog.user_id == user_id)
+    if start is not None:
+        query = query.filter(EmotionLog.timestamp >= start)
+    if end is not None:
+        query = query.filter(EmotionLog.timestamp < end)
+    return query
+
+def _filtered_rollups(query, user_id, start, end):
+    query = query.filter(EmotionDailyRollup.user_id == user_id)
+    if start is not None:
+        query = query.filter(EmotionDailyRollup.day >= start.date())
+    if end is not None:
+        query = query.filter(EmotionDailyRollup.day < end.date())
+    return query
+
+def emotion_totals(user_id, start=None, end=None):
+    '''
+    Totals, per-emotion and per-modality counts with average confidence and
+    the recent trend, read from the daily rollup table
+    '''
+    count = func.sum(EmotionDailyRollup.count)
+    confidence_sum = func.sum(EmotionDailyRollup.confidence_sum)
+
+    emotions = {}
+    for emotion, n, total_confidence in _filtered_rollups(
+        db.session.query(EmotionDailyRollup.emotion, count, confidence_sum), user_id, start, end
+    ).group_by(EmotionDailyRollup.emotion):
+        emotions[emotion] = {'count': int(n), 'avg_confidence': float(total_confidence) / n}
+
+    by_type = {}
+    for detection_type, n, total_confidence in _filtered_rollups(
+        db.session.query(EmotionDailyRollup.detection_type, count, confidence_sum), user_id, start, end
+    ).group_by(EmotionDailyRollup.detection_type):
+        by_type[detection_type] = {'count': int(n), 'avg_confidence': float(total_confidence) / n}
+
+    total = sum(item['count'] for item in emotions.values())
+    overall_confidence = sum(item['count'] * item['avg_confidence'] for item in emotions.values())
+
+    return {
+        'total': total,
+        'avg_confidence': overall_confidence / total if total else 0.0,
+        'most_common': max(emotions, key=lambda e: emotions[e]['count']) if emotions else None,
+        'emotions': emotions,
+        'by_type': by_type,
+        'trend': recent_trend(user_id, start, end),
+    }
+
+def emotion_buckets(user_id, start=None, end=None, granularity='day'):
+    '''
+    Per-period counts and average confidence, oldest period first
+    '''
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {GRANULARITIES}')
+
+    count = func.sum(EmotionDailyRollup.count)
+    confidence_sum = func.sum(EmotionDailyRollup.confidence_sum)
+
+    period = period_expression(EmotionDailyRollup.day, granularity).label('period')
+    buckets = {}
+    for label, detection_type, emotion, n, total_confidence in _filtered_rollups(
+        db.session.query(period, EmotionDailyRollup.detection_type, EmotionDailyRollup.emotion,
+                         count, confidence_sum),
+        user_id, start, end
+    ).group_by(period, EmotionDailyRollup.detection_type, EmotionDailyRollup.emotion).order_by(period):
+        bucket = buckets.setdefault(label, {
+            'period': label, 'count': 0, 'confidence_sum': 0.0, 'emotions': {}, 'by_type': {}
+        })
+        bucket['count'] += int(n)
+        bucket['confidence_sum'] += float(total_confidence)
+        bucket['emotions'][emotion] = bucket['emotions'].get(emotion, 0) + int(n)
+        bucket['by_type'][detection_type] = bucket['by_type'].get(detection_type, 0) + int(n)
+
+    for bucket in buckets.values():
+        bucket['avg_confidence'] = bucket.pop('confidence_sum') / bucket['count']
+
+    return list(buckets.values())
+
+def emotion_summary(user_id, start=None, end=None, granularity='day'):
+    '''
+    Dashboard aggregates for a user, read from the daily rollup table
+
+    Returns emotion_totals() plus the emotion_buckets() of the given
+    granularity. Dates are whole days, matching the rollup granularity.
+    '''
+    buckets = emotion_buckets(user_id, start, end, granularity)
+
+    summary = {'granularity': granularity}
+    summary.update(emotion_totals(user_id, start, end))
+    summary['buckets'] = buckets
+    return summary
+
+def daily_counts(user_id, days=365, today=None):
+    '''
+    Detections per day over the last `days` days, for the calendar heatmap
+    '''
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=days - 1)
+    rows = db.session.query(EmotionDailyRollup.day, func.sum(EmotionDailyRollup.count)) \
+        .filter(EmotionDailyRollup.user_id == user_id, EmotionDailyRollup.day >= first_day) \
+        .group_by(EmotionDailyRollup.day).order_by(EmotionDailyRollup.day)
+    return [{'date': day.isoformat(), 'count': int(n)} for day, n in rows]
+
+def recent_trend(user_id, start=None, end=None):
+    '''
+    'up', 'flat' or 'down' from the share of positive emotions in the latest detections
+    '''
+    recent = _filtered(db.session.query(EmotionLog.emotion), user_id, start, end) \
+        .order_by(EmotionLog.timestamp.desc()).limit(TREND_WINDOW).subquery()
+    positive = db.session.query(func.count()).select_from(recent) \
+        .filter(recent.c.emotion.in_(POSITIVE_EMOTIONS)).scalar()
+
+    if positive >= 4:
+        return 'up'
+    if positive >= 2:
+        return 'flat'
+    return 'down'
@@ -0,0 +1,61 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models.emotion_log import EmotionLog
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(log):
+    '''
+    Opaque cursor pointing just after a log in newest-first order
+    '''
+    raw = f'{log.timestamp.isoformat()}|{log.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def history_page(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, emotion=None, detection_type=None):
+    '''
+    One page of a user's logs, newest first, using keyset pagination
+
+    The next page continues from the (timestamp, id) of the last row instead
+    of an OFFSET, so every page is a range read on the (user_id, timestamp)
+    index no matter how deep it is.
+    '''
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = EmotionLog.query.filter(EmotionLog.user_id == user_id)
+
+    if emotion:
+        query = query.filter(EmotionLog.emotion == emotion)
+    if detection_type:
+        query = query.filter(EmotionLog.detection_type == detection_type)
+    if cursor:
+        timestamp, log_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            EmotionLog.timestamp < timestamp,
+            and_(EmotionLog.timestamp == timestamp, EmotionLog.id < log_id)
+        ))
+
+    # One extra row tells whether another page exists
+    logs = query.order_by(EmotionLog.timestamp.desc(), EmotionLog.id.desc()).limit(limit + 1).all()
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+
+    return {
+        'items': [{
+            'id': log.id,
+            'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'emotion': log.emotion,
+            'confidence': log.confidence,
+            'detection_type': log.detection_type
+        } for log in logs],
+        'next_cursor': encode_cursor(logs[-1]) if has_more else None
+    }
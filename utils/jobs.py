@@ -0,0 +1,270 @@
+import json
+import logging
+import multiprocessing
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+DONE = 'done'
+FAILED = 'failed'
+
+# Seconds between status checks when long-polling the SQLite broker
+POLL_INTERVAL = 0.1
+
+# Seconds a finished job's result stays readable; also how long a job may stay
+# queued before it is considered lost (its submitting process restarted)
+DEFAULT_RESULT_TTL = 3600
+# Least seconds between two scans for expired jobs
+PRUNE_INTERVAL = 60
+
+def _new_job(model_type, user_id):
+    return {
+        'id': uuid.uuid4().hex,
+        'status': QUEUED,
+        'model_type': model_type,
+        'user_id': user_id,
+        'result': None,
+        'error': None,
+        'created_at': time.time(),
+        'finished_at': None,
+    }
+
+class MemoryJobBroker:
+    '''
+    Job records kept in this process; status is only visible to this worker
+    '''
+
+    def __init__(self):
+        self._jobs = {}
+        self._changed = threading.Condition()
+
+    def create(self, model_type, user_id):
+        job = _new_job(model_type, user_id)
+        with self._changed:
+            self._jobs[job['id']] = job
+        return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.update(fields)
+            self._changed.notify_all()
+        return True
+
+    def get(self, job_id):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id, timeout):
+        deadline = time.time() + timeout
+        with self._changed:
+            while True:
+                job = self._jobs.get(job_id)
+                remaining = deadline - time.time()
+                if job is None or job['status'] in (DONE, FAILED) or remaining <= 0:
+                    return dict(job) if job is not None else None
+                self._changed.wait(remaining)
+
+    def prune(self, before):
+        '''
+        Remove jobs that finished, or were created and never finished, before
+        the given time; returns how many
+        '''
+        with self._changed:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if (job['finished_at'] if job['finished_at'] is not None else job['created_at']) < before
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+class SqliteJobBroker:
+    '''
+    Job records in a SQLite file, readable from every worker on the host
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            )
+        ''')
+
+    def create(self, model_type, user_id):
+        job = _new_job(model_type, user_id)
+        with self._lock:
+            self._conn.execute('INSERT INTO jobs VALUES (?, ?)', (job['id'], json.dumps(job)))
+        return job
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return False
+            job = json.loads(row[0])
+            job.update(fields)
+            self._conn.execute('UPDATE jobs SET data = ? WHERE id = ?', (json.dumps(job), job_id))
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def wait(self, job_id, timeout):
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in (DONE, FAILED) or time.time() >= deadline:
+                return job
+            time.sleep(POLL_INTERVAL)
+
+    def prune(self, before):
+        '''
+        Remove jobs that finished, or were created and never finished, before
+        the given time; returns how many
+
+        Only the process that submitted a job finishes it, so jobs left
+        queued by a restarted worker are removed here too.
+        '''
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE coalesce(json_extract(data, '$.finished_at'), "
+                "json_extract(data, '$.created_at')) < ?", (before,)
+            )
+        return cursor.rowcount
+
+def _init_worker(cache_settings, backends):
+    from ml.predict import configure_cache
+    from ml.registry import configure_backends
+    if cache_settings:
+        configure_cache(**cache_settings)
+    if backends:
+        configure_backends(backends)
+
+def _run_prediction(input_data, model_type):
+    # Runs in a worker process, which keeps its own model registry
+    from ml.predict import predict_emotion, FALLBACK_PREDICTION
+    result = predict_emotion(input_data, model_type)
+    if result is FALLBACK_PREDICTION:
+        # The predictor logged the cause in this worker; don't pass the default off as a result
+        raise RuntimeError(f'{model_type} prediction failed')
+    emotion, confidence = result
+    return {'emotion': emotion, 'confidence': confidence}
+
+class JobQueue:
+    '''
+    Run predictions in a pool of worker processes
+
+    submit() returns a job id immediately; the broker tracks the job's
+    status and result, and on_complete is called in this process with the
+    finished job so it can be persisted. Finished jobs are removed
+    result_ttl seconds after they finish, checked when jobs are submitted
+    or polled.
+    '''
+
+    def __init__(self, broker, workers=2, on_complete=None, cache_settings=None, backends=None,
+                 result_ttl=DEFAULT_RESULT_TTL):
+        self.broker = broker
+        self.result_ttl = result_ttl
+        self._pruned_at = 0
+        self.workers = workers
+        self.on_complete = on_complete
+        self.cache_settings = cache_settings
+        self.backends = backends
+        self._executor = None
+        self._start_lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._start_lock:
+                if self._executor is None:
+                    # spawn: forking a process that already runs TensorFlow threads is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker,
+                        initargs=(self.cache_settings, self.backends)
+                    )
+        return self._executor
+
+    def prune_expired(self):
+        now = time.time()
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return 0
+        self._pruned_at = now
+        try:
+            return self.broker.prune(now - self.result_ttl)
+        except Exception:
+            logger.exception('Error pruning expired jobs')
+            return 0
+
+    def submit(self, input_data, model_type, user_id):
+        self.prune_expired()
+        job = self.broker.create(model_type, user_id)
+        future = self._get_executor().submit(_run_prediction, input_data, model_type)
+        future.add_done_callback(lambda f, submitted=job: self._finish(submitted, f))
+        return job['id']
+
+    def _finish(self, submitted, future):
+        job_id = submitted['id']
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error('Error in prediction job %s: %s', job_id, e)
+            self.broker.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            return
+
+        job = self.broker.get(job_id)
+        if job is None:
+            # Pruned while it ran; on_complete still persists the result
+            logger.warning('Prediction job %s finished after it expired', job_id)
+            job = dict(submitted)
+        job.update(status=DONE, result=result, finished_at=time.time())
+        if self.on_complete is not None:
+            try:
+                self.on_complete(job)
+            except Exception:
+                logger.exception('Error completing prediction job %s', job_id)
+        self.broker.update(job_id, status=DONE, result=result, finished_at=job['finished_at'])
+
+    def get(self, job_id):
+        self.prune_expired()
+        return self.broker.get(job_id)
+
+    def wait(self, job_id, timeout):
+        self.prune_expired()
+        return self.broker.wait(job_id, timeout)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+def create_job_queue(broker='memory', path=None, workers=2, on_complete=None, cache_settings=None,
+                     backends=None, result_ttl=DEFAULT_RESULT_TTL):
+    '''
+    Build a JobQueue for a broker name ('memory' or 'sqlite')
+    '''
+    if broker == 'memory':
+        backend = MemoryJobBroker()
+    elif broker == 'sqlite':
+        backend = SqliteJobBroker(path or 'jobs.db')
+    else:
+        raise ValueError(f'Unknown job broker: {broker}')
+    return JobQueue(backend, workers=workers, on_complete=on_complete, cache_settings=cache_settings,
+                    backends=backends, result_ttl=result_ttl)
@@ -0,0 +1,196 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db
+from models.emotion_log import EmotionLog
+from utils.analytics import emotion_totals, emotion_buckets, daily_counts, GRANULARITIES
+
+# Logs committed by other worker processes are picked up by polling this often
+POLL_INTERVAL = 5.0
+# Comment line sent on idle connections so dead clients are noticed
+KEEPALIVE_INTERVAL = 15.0
+# Streams end after this long and the browser reconnects with Last-Event-ID,
+# so each open tab holds a server thread for a bounded time
+MAX_STREAM_SECONDS = 30
+# Client reconnect delay announced to EventSource, in milliseconds
+RETRY_MS = 3000
+MAX_LOGS_PER_EVENT = 200
+# Open streams per user and process; more tabs are told to retry later
+MAX_STREAMS_PER_USER = 3
+BUSY_RETRY_MS = 30000
+
+class LogNotifier:
+    '''
+    Wakes the dashboard streams of users whose logs were just committed
+    '''
+
+    def __init__(self):
+        self._versions = {}
+        self._changed = threading.Condition()
+
+    def version(self, user_id):
+        with self._changed:
+            return self._versions.get(user_id, 0)
+
+    def notify(self, user_ids):
+        with self._changed:
+            for user_id in user_ids:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._changed.notify_all()
+
+    def wait(self, user_id, version, timeout):
+        '''
+        Block until the user's version moves past `version` or timeout passes
+        '''
+        deadline = time.time() + timeout
+        with self._changed:
+            while self._versions.get(user_id, 0) == version:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
+
+notifier = LogNotifier()
+
+class StreamSlots:
+    '''
+    Counts the open dashboard streams of each user in this process
+    '''
+
+    def __init__(self):
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id, limit):
+        with self._lock:
+            if self._open.get(user_id, 0) >= limit:
+                return False
+            self._open[user_id] = self._open.get(user_id, 0) + 1
+            return True
+
+    def release(self, user_id):
+        with self._lock:
+            self._open[user_id] -= 1
+            if not self._open[user_id]:
+                del self._open[user_id]
+
+    def count(self, user_id):
+        with self._lock:
+            return self._open.get(user_id, 0)
+
+stream_slots = StreamSlots()
+
+@event.listens_for(db.session.__class__, 'after_flush')
+def _collect_new_logs(session, flush_context):
+    users = {obj.user_id for obj in session.new if isinstance(obj, EmotionLog)}
+    if users:
+        session.info.setdefault('emotion_log_users', set()).update(users)
+
+@event.listens_for(db.session.__class__, 'after_commit')
+def _notify_committed_logs(session):
+    users = session.info.pop('emotion_log_users', None)
+    if users:
+        notifier.notify(users)
+
+@event.listens_for(db.session.__class__, 'after_rollback')
+def _discard_rolled_back_logs(session):
+    session.info.pop('emotion_log_users', None)
+
+def period_start(timestamp, granularity):
+    '''
+    Midnight starting the period a timestamp falls in, matching utils.analytics buckets
+    '''
+    day = timestamp.date()
+    if granularity == 'month':
+        day = day.replace(day=1)
+    elif granularity == 'week':
+        day = day - timedelta(days=day.weekday())
+    return datetime.combine(day, datetime.min.time())
+
+def changes(user_id, logs, granularity):
+    '''
+    New logs plus the aggregates they changed
+
+    Aggregates are sent as absolute values (totals, the timeline buckets
+    and heatmap days from the oldest new log on), so applying an event
+    twice leaves the dashboard unchanged.
+    '''
+    oldest = min(log.timestamp for log in logs)
+    first_day, last_day = oldest.date(), max(log.timestamp for log in logs).date()
+
+    return {
+        'logs': [{
+            'id': log.id,
+            'emotion': log.emotion,
+            'confidence': log.confidence,
+            'detection_type': log.detection_type,
+            'timestamp': log.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        } for log in logs],
+        'summary': emotion_totals(user_id),
+        'buckets': emotion_buckets(user_id, start=period_start(oldest, granularity), granularity=granularity),
+        'days': daily_counts(user_id, days=(last_day - first_day).days + 1, today=last_day)
+    }
+
+def _event(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def dashboard_events(user_id, cursor, granularity='day', poll_interval=POLL_INTERVAL,
+                     max_seconds=MAX_STREAM_SECONDS, max_streams=MAX_STREAMS_PER_USER):
+    '''
+    Server-Sent Events with the user's logs committed after `cursor` (a log id)
+
+    Each 'logs' event carries changes() for a batch of new logs; its id is
+    the newest log id, which EventSource sends back as Last-Event-ID when
+    it reconnects. When the user already has max_streams open, a single
+    'busy' event asks the browser to reconnect after BUSY_RETRY_MS instead.
+    '''
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {GRANULARITIES}')
+
+    if not stream_slots.acquire(user_id, max_streams):
+        yield f'retry: {BUSY_RETRY_MS}\n\n'
+        yield _event('busy', {'max_streams': max_streams})
+        return
+
+    try:
+        yield from _log_events(user_id, cursor, granularity, poll_interval, max_seconds)
+    finally:
+        # Also runs when the client disconnects and the generator is closed
+        stream_slots.release(user_id)
+
+def _log_events(user_id, cursor, granularity, poll_interval, max_seconds):
+    yield f'retry: {RETRY_MS}\n\n'
+    started = last_sent = time.time()
+
+    while time.time() - started < max_seconds:
+        version = notifier.version(user_id)
+        logs = EmotionLog.query.filter(EmotionLog.user_id == user_id, EmotionLog.id > cursor) \
+            .order_by(EmotionLog.id).limit(MAX_LOGS_PER_EVENT).all()
+
+        if logs:
+            cursor = logs[-1].id
+            payload = changes(user_id, logs, granularity)
+            # End the read transaction so the next poll sees newer commits
+            db.session.rollback()
+            yield _event('logs', payload, event_id=cursor)
+            last_sent = time.time()
+            if len(logs) == MAX_LOGS_PER_EVENT:
+                continue
+        else:
+            db.session.rollback()
+
+        if time.time() - last_sent >= KEEPALIVE_INTERVAL:
+            yield ': keepalive\n\n'
+            last_sent = time.time()
+
+        notifier.wait(user_id, version, min(poll_interval, KEEPALIVE_INTERVAL))
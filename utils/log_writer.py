@@ -0,0 +1,198 @@
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from ml.metrics import span
+from models import db
+from models.emotion_log import EmotionLog
+
+logger = logging.getLogger(__name__)
+
+# Write modes
+SYNC = 'sync'
+BUFFERED = 'buffered'
+WRITE_MODES = (SYNC, BUFFERED)
+
+DEFAULT_FLUSH_ROWS = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Queued rows before log() writes synchronously instead
+DEFAULT_MAX_PENDING = 10000
+# Failed bulk inserts in a row before the rows are retried one by one
+MAX_BATCH_ATTEMPTS = 3
+
+class EmotionLogWriter:
+    '''
+    Persists EmotionLog rows either immediately or write-behind
+
+    In 'sync' mode every call commits before returning. In 'buffered' mode
+    rows are queued and a background thread inserts them in one transaction
+    once `flush_rows` are pending or `flush_interval` seconds have passed,
+    so requests do not wait on a disk commit. Rows queued but not yet
+    flushed are lost if the process is killed; close() flushes the rest on
+    a normal shutdown.
+
+    At most `max_pending` rows are queued: past that, callers write their
+    rows synchronously, which slows requests down instead of growing memory
+    while the database is unavailable. After MAX_BATCH_ATTEMPTS failed bulk
+    inserts the rows are inserted one by one; rows that fail on their own
+    for any reason but an unavailable database are dropped.
+    '''
+
+    def __init__(self, app, mode=BUFFERED, flush_rows=DEFAULT_FLUSH_ROWS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=DEFAULT_MAX_PENDING):
+        if mode not in WRITE_MODES:
+            raise ValueError(f'mode must be one of {WRITE_MODES}')
+        self.app = app
+        self.mode = mode
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._failed_attempts = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._stats = {'flushes': 0, 'rows': 0, 'failures': 0, 'dropped': 0, 'sync_fallbacks': 0}
+
+    def log(self, user_id, emotion, confidence, detection_type):
+        self.log_many([(user_id, emotion, confidence, detection_type)])
+
+    def log_many(self, rows):
+        '''
+        rows: iterable of (user_id, emotion, confidence, detection_type)
+        '''
+        # Stamp now so a delayed flush keeps the detection time
+        now = datetime.utcnow()
+        rows = [{
+            'user_id': user_id,
+            'emotion': emotion,
+            'confidence': float(confidence),
+            'detection_type': detection_type,
+            'timestamp': now
+        } for user_id, emotion, confidence, detection_type in rows]
+        if not rows:
+            return
+
+        if self.mode == SYNC or self._closed:
+            self._write(rows)
+            with self._lock:
+                self._stats['rows'] += len(rows)
+            return
+
+        with self._lock:
+            full = len(self._pending) + len(rows) > self.max_pending
+            if not full:
+                self._pending.extend(rows)
+            pending = len(self._pending)
+            if self._thread is None:
+                # Started lazily so forked server workers each get their own
+                self._thread = threading.Thread(target=self._run, name='emotion-log-writer', daemon=True)
+                self._thread.start()
+        if pending >= self.flush_rows:
+            self._wake.set()
+        if full:
+            self._write_behind_full_queue(rows)
+
+    def _write_behind_full_queue(self, rows):
+        # Backpressure: the caller pays for its own commit until the queue drains
+        with self._lock:
+            self._stats['sync_fallbacks'] += 1
+        try:
+            self._write(rows)
+        except Exception as e:
+            logger.error('Dropping %d emotion logs: write with a full queue failed: %s', len(rows), e)
+            with self._lock:
+                self._stats['failures'] += 1
+                self._stats['dropped'] += len(rows)
+            return
+        with self._lock:
+            self._stats['rows'] += len(rows)
+
+    def _write(self, rows):
+        with span('db_commit'), self.app.app_context():
+            try:
+                db.session.add_all([EmotionLog(**row) for row in rows])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def flush(self):
+        '''
+        Insert everything queued so far; returns the number of rows written
+        '''
+        with self._lock:
+            rows = list(self._pending)
+            self._pending.clear()
+        if not rows:
+            return 0
+
+        try:
+            self._write(rows)
+        except Exception as e:
+            logger.warning('Error flushing %d emotion logs: %s', len(rows), e)
+            with self._lock:
+                self._stats['failures'] += 1
+                self._failed_attempts += 1
+                retry_singly = self._failed_attempts >= MAX_BATCH_ATTEMPTS
+                if not retry_singly:
+                    # Keep them for the next attempt, ahead of newer rows
+                    self._pending.extendleft(reversed(rows))
+            if retry_singly:
+                return self._flush_singly(rows)
+            return 0
+
+        with self._lock:
+            self._failed_attempts = 0
+            self._stats['flushes'] += 1
+            self._stats['rows'] += len(rows)
+        return len(rows)
+
+    def _flush_singly(self, rows):
+        '''
+        Insert rows one per transaction so one bad row cannot hold back the rest
+        '''
+        written, unavailable = 0, []
+        for row in rows:
+            try:
+                self._write([row])
+                written += 1
+            except OperationalError:
+                # Database locked or unreachable: not this row's fault
+                unavailable.append(row)
+            except Exception as e:
+                logger.error('Dropping emotion log that cannot be inserted %s: %s', row, e)
+                with self._lock:
+                    self._stats['dropped'] += 1
+
+        with self._lock:
+            self._failed_attempts = 0
+            self._pending.extendleft(reversed(unavailable))
+            self._stats['rows'] += written
+            if written:
+                self._stats['flushes'] += 1
+        return written
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        '''
+        Stop the background thread and flush pending rows
+        '''
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, mode=self.mode, pending=len(self._pending))